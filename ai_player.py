@@ -1,17 +1,207 @@
+import threading
 from othello.player import Player
 from othello import utilities
+from othello.ai.iterative_deepening import IterativeDeepening
+from othello.ai.endgame_solver import ENDGAME_SOLVER_SHAPE
+from othello.ai.monte_carlo_tree_search import MonteCarloTreeSearch
+from othello.ai.alpha_beta import AlphaBeta
+from othello.ai.search_algorithm import SearchCancelled
 
 
+# With an endgame_solver, positions on 8x8 boards with at most
+# endgame_empties empty squares are solved exactly instead of searched. It
+# is opt-in so that existing players keep their moves, and because a solve
+# ignores time_budget (10 empties take about 0.2s); the app turns it on.
 class AiPlayer(Player):
-    def __init__(self, search_algorithm, evaluator):
+    def __init__(self, search_algorithm, evaluator, endgame_solver=None, endgame_empties=10,
+                 opening_book=None, ponder=False, ponder_time_limit=60.0, ponder_reuse_depth=4):
         super(AiPlayer, self).__init__()
         self._search_algorithm = search_algorithm
         self._state_evaluator = evaluator
+        self._iterative_deepening = None
+        self._endgame_solver = endgame_solver
+        self._endgame_empties = endgame_empties
+        self._opening_book = opening_book
+        self._ponder = ponder
+        self._ponder_time_limit = ponder_time_limit
+        self._ponder_reuse_depth = ponder_reuse_depth
+        self._ponder_thread = None
+        self._ponder_search_algorithm = None
+        self._ponder_position = None
+        self._ponder_result = None
+        self._reply_predictor = AlphaBeta(depth=2)
+        self._ponder_lock = threading.Lock()
+        self._killed = False
 
-    def select_move(self, board_state):
+    def new_game(self):
+        # force_kill stays in effect until the next game
+        self._killed = False
+        self.stop_pondering()
+        for search_algorithm in self.search_algorithms():
+            search_algorithm.clear_stop()
+        if self._state_evaluator is not None:
+            self._state_evaluator.begin_game()
+
+    def select_move(self, board_state, time_budget=None):
+        # Returns None when force_kill cancels the search
+        self.stop_pondering()
+        if self._killed:
+            return None
+        # The opening book and the endgame solver take precedence over pondering
+        move = self.opening_book_move(board_state)
+        if move is None and not self.uses_endgame_solver(board_state):
+            move = self.pondered_move(board_state)
+        if move is None:
+            try:
+                move = self.search_move(board_state, time_budget)
+            except SearchCancelled:
+                return None
+        # Pondering predicts the reply with a shallow search, so it needs an evaluator
+        if self._ponder and self._state_evaluator is not None and move is not None and not self._killed:
+            self.start_pondering(board_state, move, time_budget)
+        return move
+
+    def force_kill(self):
+        self._killed = True
+        self.stop_pondering()
+        for search_algorithm in self.search_algorithms():
+            search_algorithm.stop()
+
+    def search_algorithms(self):
+        search_algorithms = [self._search_algorithm]
+        if self._endgame_solver is not None:
+            search_algorithms.append(self._endgame_solver)
+        if self._iterative_deepening is not None:
+            search_algorithms.append(self._iterative_deepening)
+        return search_algorithms
+
+    def opening_book_move(self, board_state):
+        if self._opening_book is None:
+            return None
+        return self._opening_book.lookup(board_state, self.color())
+
+    def search_move(self, board_state, time_budget):
+        player_color = self.color()
+        opponent_color = utilities.opponent_color(player_color)
+        search_algorithm = self._search_algorithm
+        if self.uses_endgame_solver(board_state):
+            search_algorithm = self._endgame_solver
+        elif time_budget is not None:
+            search_algorithm = self.time_budgeted_search_algorithm(time_budget)
+        if self._state_evaluator is not None:
+            self._state_evaluator.begin_search()
+        if search_algorithm.statistics_listener() is None:
+            return search_algorithm.search_optimal_move(board_state,
+                                                        self._state_evaluator,
+                                                        player_color,
+                                                        opponent_color)
+        (move, _) = search_algorithm.search_with_statistics(board_state,
+                                                            self._state_evaluator,
+                                                            player_color,
+                                                            opponent_color)
+        return move
+
+    def uses_endgame_solver(self, board_state):
+        return self._endgame_solver is not None and board_state.shape == ENDGAME_SOLVER_SHAPE and \
+            board_state.empty_count() <= self._endgame_empties
+
+    def time_budgeted_search_algorithm(self, time_budget):
+        search_algorithm = self._search_algorithm
+        if not isinstance(search_algorithm, MonteCarloTreeSearch):
+            search_algorithm = self.iterative_deepening_search_algorithm()
+        search_algorithm.set_time_budget(time_budget)
+        return search_algorithm
+
+    def iterative_deepening_search_algorithm(self):
+        # Shares the configured search's table, so that both time budgeted
+        # and fixed depth searches read what pondering stored
+        if isinstance(self._search_algorithm, IterativeDeepening):
+            return self._search_algorithm
+        if self._iterative_deepening is None:
+            transposition_table = None
+            if isinstance(self._search_algorithm, AlphaBeta):
+                transposition_table = self._search_algorithm.transposition_table()
+            self._iterative_deepening = IterativeDeepening(transposition_table=transposition_table)
+            if self._killed:
+                self._iterative_deepening.stop()
+        return self._iterative_deepening
+
+    def start_pondering(self, board_state, move, time_budget):
+        # Searches the position after the predicted reply until the opponent
+        # moves, with the search the next select_move would run
+        player_color = self.color()
+        self._ponder_result = None
+        self._ponder_position = None
+        if time_budget is None:
+            search_algorithm = self._search_algorithm
+        else:
+            search_algorithm = self.time_budgeted_search_algorithm(self._ponder_time_limit)
+        next_state = board_state.next_board_state(move, player_color)
+        self._ponder_search_algorithm = search_algorithm
+        self._ponder_thread = threading.Thread(target=self.ponder,
+                                               args=(search_algorithm, next_state),
+                                               name='ponder_thread')
+        self._ponder_thread.daemon = True
+        self._ponder_thread.start()
+
+    def ponder(self, search_algorithm, board_state):
+        # Predicting the reply here keeps it off select_move's clock and lets
+        # stop_pondering cancel it
         player_color = self.color()
         opponent_color = utilities.opponent_color(player_color)
-        return self._search_algorithm.search_optimal_move(board_state,
-                                                          self._state_evaluator,
-                                                          player_color,
-                                                          opponent_color)
+        try:
+            if board_state.has_valid_move(opponent_color):
+                reply = self.predict_reply(board_state, search_algorithm)
+                board_state = board_state.next_board_state(reply, opponent_color)
+            if not board_state.has_valid_move(player_color) or \
+                    self.opening_book_move(board_state) is not None or self.uses_endgame_solver(board_state):
+                return
+            self._ponder_position = board_state.as_bit_boards()
+            self._state_evaluator.begin_search()
+            move = search_algorithm.search_optimal_move(board_state, self._state_evaluator,
+                                                        player_color, opponent_color)
+        except SearchCancelled:
+            return
+        # A stopped iterative deepening search still returns the move of its
+        # last completed depth, which may be too shallow to play
+        if isinstance(search_algorithm, IterativeDeepening):
+            completed_depth = search_algorithm.completed_depth()
+            if completed_depth is None or completed_depth < self._ponder_reuse_depth:
+                return
+        self._ponder_result = move
+
+    def predict_reply(self, board_state, search_algorithm):
+        # The reply our own last search expected, or a shallow search for it
+        player_color = self.color()
+        opponent_color = utilities.opponent_color(player_color)
+        if isinstance(search_algorithm, AlphaBeta) and search_algorithm.transposition_table() is not None:
+            table = search_algorithm.transposition_table()
+            valid_moves = board_state.list_all_valid_moves(opponent_color)
+            reply = table.best_move(table.hash_key(board_state, opponent_color))
+            if reply in valid_moves:
+                return reply
+        return self._reply_predictor.search_optimal_move(board_state, self._state_evaluator,
+                                                         opponent_color, player_color)
+
+    def stop_pondering(self):
+        # Called from the game thread and from force_kill; the stop is only
+        # cleared when force_kill has not asked for it to stay
+        with self._ponder_lock:
+            if self._ponder_thread is None:
+                return
+            search_algorithm = self._ponder_search_algorithm
+            search_algorithm.stop()
+            self._reply_predictor.stop()
+            self._ponder_thread.join()
+            self._ponder_thread = None
+            self._ponder_search_algorithm = None
+            self._reply_predictor.clear_stop()
+            if not self._killed:
+                search_algorithm.clear_stop()
+
+    def pondered_move(self, board_state):
+        if self._ponder_result is None or self._ponder_position != board_state.as_bit_boards():
+            return None
+        move = self._ponder_result
+        self._ponder_result = None
+        return move
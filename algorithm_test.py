@@ -1,12 +1,28 @@
 import csv
+import os
+import tempfile
+import random
 import time
 import numpy as np
 from logging import getLogger, INFO, basicConfig
 from othello.ai.alpha_beta import AlphaBeta
 from othello.ai.minimax import MiniMax
+from othello.ai.principal_variation_search import PrincipalVariationSearch
+from othello.ai.parallel_alpha_beta import ParallelAlphaBeta
+from othello.ai.multi_prob_cut import MultiProbCut, ProbCutCalibrator
 from othello.ai.evaluator import Evaluator
-from othello.bit_board import BitBoard
+from othello.ai.bit_board_evaluator import BitBoardEvaluator
+from othello.ai.opening_book import OpeningBook, write_opening_book
+from othello.ai.transposition_table import TranspositionTable
+from othello.ai.endgame_solver import EndgameSolver, WIN_LOSS_DRAW, square_bit
+from othello.ai.cached_evaluator import CachedEvaluator, PER_SEARCH, PER_GAME
+from othello.bit_board import BitBoard, SYMMETRY_NUM, transform
 from othello.libfastbb import FastBitBoard
+from othello.board_batch import BoardBatch
+from othello.game_record import GameRecordWriter, GameRecordReader, PLY_COUNTS_SUFFIX
+from othello.training_data import build_batch, ALL_SYMMETRIES, PLAYER_PLANE, OPPONENT_PLANE, \
+    LEGAL_MOVES_PLANE
+from othello.position_index import PositionIndex, EMPTY
 from othello.matrix_board import MatrixBoard
 
 
@@ -27,6 +43,431 @@ def algorithm_sanity_check(evaluator, player_color, opponent_color, depth):
 
     assert alpha_beta_best_move == minimax_best_move
 
+    principal_variation_search = PrincipalVariationSearch(depth=depth)
+    principal_variation_search_best_move = principal_variation_search.search_optimal_move(
+        board_state, evaluator, player_color, opponent_color)
+
+    assert alpha_beta_best_move == principal_variation_search_best_move
+
+
+def parallel_alpha_beta_sanity_check(evaluator, player_color, opponent_color, depth):
+    # Check that the parallel search picks the sequential move on every board
+    # type the engine uses
+    parallel_alpha_beta = ParallelAlphaBeta(depth=depth, processes=2)
+    try:
+        for board_state in (BitBoard(), FastBitBoard()):
+            alpha_beta_best_move = AlphaBeta(depth=depth).search_optimal_move(
+                board_state, evaluator, player_color, opponent_color)
+            parallel_best_move = parallel_alpha_beta.search_optimal_move(
+                board_state, evaluator, player_color, opponent_color)
+            assert alpha_beta_best_move == parallel_best_move
+    finally:
+        parallel_alpha_beta.close()
+
+
+def random_positions(count, max_plies=40):
+    positions = []
+    while len(positions) < count:
+        board_state = BitBoard()
+        player_color = 'black'
+        for _ in range(random.randrange(max_plies)):
+            valid_moves = board_state.list_all_valid_moves(player_color)
+            if valid_moves:
+                board_state.apply_new_move(random.choice(valid_moves), player_color)
+            player_color = 'white' if player_color == 'black' else 'black'
+        if board_state.has_valid_move(player_color):
+            positions.append((board_state, player_color))
+    return positions
+
+
+def multi_prob_cut_sanity_check(depth=4):
+    # Check that MultiProbCut without parameters is AlphaBeta, and that
+    # fitted parameters cut nodes without returning illegal moves
+    evaluator = BitBoardEvaluator()
+    positions = random_positions(10)
+    for (board_state, player_color) in positions:
+        opponent_color = 'white' if player_color == 'black' else 'black'
+        assert MultiProbCut(depth=depth).search_optimal_move(
+            board_state, evaluator, player_color, opponent_color) == \
+            AlphaBeta(depth=depth).search_optimal_move(
+                board_state, evaluator, player_color, opponent_color)
+
+    calibrator = ProbCutCalibrator(evaluator, depth_pairs=((3, 1),))
+    for (board_state, player_color) in random_positions(30):
+        calibrator.add_position(board_state, player_color)
+    multi_prob_cut = MultiProbCut(depth=depth, parameters=calibrator.fit())
+    cut_count = 0
+    for (board_state, player_color) in positions:
+        opponent_color = 'white' if player_color == 'black' else 'black'
+        move = multi_prob_cut.search_optimal_move(board_state, evaluator, player_color, opponent_color)
+        assert board_state.is_valid_move(move, player_color)
+        cut_count += multi_prob_cut.cut_count()
+    assert cut_count > 0
+
+
+def evaluator_sanity_check(games=20):
+    # Check that the bit board evaluator scores exactly like Evaluator
+    evaluator = Evaluator()
+    bit_board_evaluator = BitBoardEvaluator()
+    for _ in range(games):
+        board_state = BitBoard()
+        player_color = 'black'
+        while not board_state.is_end_state():
+            for (color, other) in (('black', 'white'), ('white', 'black')):
+                assert evaluator.evaluate(board_state, color, other) == \
+                    bit_board_evaluator.evaluate(board_state, color, other)
+            valid_moves = board_state.list_all_valid_moves(player_color)
+            if valid_moves:
+                board_state.apply_new_move(random.choice(valid_moves), player_color)
+            player_color = 'white' if player_color == 'black' else 'black'
+
+
+def matrix_board_sanity_check(games=20):
+    # Check that MatrixBoard finds the same moves and flips as BitBoard
+    for _ in range(games):
+        bit_board = BitBoard()
+        matrix_board = MatrixBoard()
+        player_color = 'black'
+        while not bit_board.is_end_state():
+            assert not matrix_board.is_end_state()
+            valid_moves = bit_board.list_all_valid_moves(player_color)
+            assert matrix_board.list_all_valid_moves(player_color) == valid_moves
+            assert matrix_board.list_all_empty_positions() == bit_board.list_all_empty_positions()
+            for position in bit_board.list_all_empty_positions():
+                assert matrix_board.is_valid_move(position, player_color) == \
+                    bit_board.is_valid_move(position, player_color)
+            for move in valid_moves:
+                flipped_squares = matrix_board.make_move(move, player_color)
+                assert matrix_board.as_bit_boards() == \
+                    bit_board.next_board_state(move, player_color).as_bit_boards()
+                matrix_board.undo_move(move, flipped_squares, player_color)
+                assert matrix_board.as_bit_boards() == bit_board.as_bit_boards()
+            if valid_moves:
+                move = random.choice(valid_moves)
+                bit_board.apply_new_move(move, player_color)
+                matrix_board.apply_new_move(move, player_color)
+            player_color = 'white' if player_color == 'black' else 'black'
+        assert matrix_board.is_end_state()
+
+
+def opening_book_sanity_check():
+    # Check that book keys differing only in their low bits do not match
+    # each other; numpy compares uint64 with a long through float64
+    opponent_board = 0x0000001008000000
+    player_boards = [(1 << 60) + low_bits for low_bits in range(128)]
+    (book_file, path) = tempfile.mkstemp()
+    os.close(book_file)
+    try:
+        write_opening_book(path, [(player_board, opponent_board, index, 1, 0.0)
+                                  for (index, player_board) in enumerate(player_boards[:64])])
+        book = OpeningBook(path)
+        for (index, player_board) in enumerate(player_boards):
+            slot = book.find_slot(player_board, opponent_board)
+            if index < 64:
+                assert slot is not None and book._moves[slot] == index
+            else:
+                assert slot is None
+    finally:
+        os.remove(path)
+
+
+def transposition_table_sanity_check(depth=3):
+    # Check that a table changes neither the root move nor the root value;
+    # mislabelled bounds would. Each search gets a fresh table, since deeper
+    # entries left by earlier searches legitimately change values.
+    evaluator = BitBoardEvaluator()
+    for (board_state, player_color) in random_positions(8):
+        opponent_color = 'white' if player_color == 'black' else 'black'
+        valid_moves = board_state.list_all_valid_moves(player_color)
+        alpha_beta_with_table = AlphaBeta(depth=depth, transposition_table=TranspositionTable())
+        assert alpha_beta_with_table.search_root(board_state, evaluator, player_color, opponent_color,
+                                                 valid_moves, depth) == \
+            AlphaBeta(depth=depth).search_root(board_state, evaluator, player_color, opponent_color,
+                                               valid_moves, depth)
+        minimax_with_table = MiniMax(depth=depth, transposition_table=TranspositionTable())
+        for move in valid_moves:
+            assert minimax_with_table.search_child(board_state, move, player_color, evaluator,
+                                                   player_color, opponent_color, depth, False) == \
+                MiniMax(depth=depth).search_child(board_state, move, player_color, evaluator,
+                                                  player_color, opponent_color, depth, False)
+
+
+def exact_score(board_state, player_color, passes):
+    # Final disc difference for player_color under perfect play, by brute force
+    opponent_color = 'white' if player_color == 'black' else 'black'
+    if board_state.is_end_state():
+        return board_state.disc_difference(player_color)
+    if not board_state.has_valid_move(player_color):
+        passes.append(board_state)
+        return -exact_score(board_state, opponent_color, passes)
+    return max(-exact_score(board_state.next_board_state(move, player_color), opponent_color, passes)
+               for move in board_state.list_all_valid_moves(player_color))
+
+
+def endgame_solver_sanity_check(positions_per_empties=3, max_empties=8):
+    # Check exact and win/loss/draw solving against brute force at 1 to 8
+    # empties, which covers solve_1, solve_2, solve_few and the move ordered
+    # search, and include positions whose search has to pass
+    exact_solver = EndgameSolver()
+    win_loss_draw_solver = EndgameSolver(mode=WIN_LOSS_DRAW)
+    checked = dict((empties, 0) for empties in range(1, max_empties + 1))
+    pass_checked = False
+    while min(checked.values()) < positions_per_empties or not pass_checked:
+        board_state = BitBoard()
+        player_color = 'black'
+        while not board_state.is_end_state():
+            empties = board_state.empty_count()
+            valid_moves = board_state.list_all_valid_moves(player_color)
+            if valid_moves and empties <= max_empties:
+                passes = []
+                score = exact_score(board_state, player_color, passes)
+                if checked[empties] < positions_per_empties or (passes and not pass_checked):
+                    opponent_color = 'white' if player_color == 'black' else 'black'
+                    (move, solved_score) = exact_solver.solve(board_state, player_color)
+                    assert solved_score == score
+                    assert -exact_score(board_state.next_board_state(move, player_color),
+                                        opponent_color, []) == score
+                    (move, solved_score) = win_loss_draw_solver.solve(board_state, player_color)
+                    assert cmp(solved_score, 0) == cmp(score, 0)
+                    assert cmp(-exact_score(board_state.next_board_state(move, player_color),
+                                            opponent_color, []), 0) == cmp(score, 0)
+                    checked[empties] += 1
+                    pass_checked = pass_checked or bool(passes)
+            if valid_moves:
+                board_state.apply_new_move(random.choice(valid_moves), player_color)
+            player_color = 'white' if player_color == 'black' else 'black'
+
+
+def replayed_positions(games):
+    # (board_state, player_color, move) of every move of random games
+    positions = []
+    for _ in range(games):
+        board_state = BitBoard()
+        player_color = 'black'
+        while not board_state.is_end_state():
+            valid_moves = board_state.list_all_valid_moves(player_color)
+            if valid_moves:
+                move = random.choice(valid_moves)
+                positions.append((board_state, player_color, move))
+                board_state = board_state.next_board_state(move, player_color)
+            player_color = 'white' if player_color == 'black' else 'black'
+    return positions
+
+
+def board_batch_sanity_check(games=10):
+    # Check BoardBatch masks, flips and moves against BitBoard, with black
+    # and white to move mixed in one batch
+    positions = replayed_positions(games)
+    batch = BoardBatch.from_boards([board_state for (board_state, _, _) in positions])
+    black_to_move = np.array([player_color == 'black' for (_, player_color, _) in positions])
+    move_bit_boards = np.array([square_bit(move) for (_, _, move) in positions], dtype=np.uint64)
+    legal_moves_masks = batch.legal_moves_mask(black_to_move)
+    flip_patterns = batch.flip_patterns(move_bit_boards, black_to_move)
+    next_batch = batch.apply_new_moves(move_bit_boards, black_to_move)
+    disc_differences = batch.disc_differences(black_to_move)
+    for (index, (board_state, player_color, move)) in enumerate(positions):
+        assert int(legal_moves_masks[index]) == \
+            sum(square_bit(valid_move) for valid_move in board_state.list_all_valid_moves(player_color))
+        next_state = board_state.next_board_state(move, player_color)
+        assert next_batch.board(index).as_bit_boards() == next_state.as_bit_boards()
+        opponent_index = 1 if player_color == 'black' else 0
+        assert int(flip_patterns[index]) == board_state.as_bit_boards()[opponent_index] & \
+            ~next_state.as_bit_boards()[opponent_index]
+        assert disc_differences[index] == board_state.disc_difference(player_color)
+    assert not batch.is_end_state().any()
+
+
+def replayed_games(games):
+    # Random games as lists of (player_color, move)
+    game_moves = []
+    for _ in range(games):
+        board_state = BitBoard()
+        player_color = 'black'
+        moves = []
+        while not board_state.is_end_state():
+            valid_moves = board_state.list_all_valid_moves(player_color)
+            if valid_moves:
+                move = random.choice(valid_moves)
+                moves.append((player_color, move))
+                board_state.apply_new_move(move, player_color)
+            player_color = 'white' if player_color == 'black' else 'black'
+        game_moves.append(moves)
+    return game_moves
+
+
+def game_record_sanity_check(games=10):
+    # Check that game records read back the moves and positions of BitBoard
+    # replays, with and without the ply count sidecar
+    game_moves = replayed_games(games)
+    (record_file, path) = tempfile.mkstemp()
+    os.close(record_file)
+    os.remove(path)
+    try:
+        with GameRecordWriter(path) as writer:
+            for moves in game_moves[:games // 2]:
+                writer.append(moves)
+        # Appending to a file without its sidecar rebuilds the sidecar
+        os.remove(path + PLY_COUNTS_SUFFIX)
+        with GameRecordWriter(path) as writer:
+            for moves in game_moves[games // 2:]:
+                writer.append(moves)
+        expected = []
+        reader = GameRecordReader(path)
+        for (game_index, moves) in enumerate(game_moves):
+            assert reader.moves(game_index) == moves
+            board_state = BitBoard()
+            for (ply, (player_color, move)) in enumerate(moves):
+                assert reader.position(game_index, ply) == board_state.as_bit_boards()
+                expected.append(board_state.as_bit_boards() + (player_color == 'black', game_index, ply))
+                board_state.apply_new_move(move, player_color)
+            assert reader.position(game_index, len(moves)) == board_state.as_bit_boards()
+        for with_sidecar in (True, False):
+            if not with_sidecar:
+                os.remove(path + PLY_COUNTS_SUFFIX)
+                reader = GameRecordReader(path)
+            assert reader.position_count() == len(expected)
+            indices = np.random.permutation(len(expected))
+            positions = reader.positions(indices)
+            for (row, index) in enumerate(indices):
+                assert (int(positions['black'][row]), int(positions['white'][row]),
+                        bool(positions['black_to_move'][row]), int(positions['game'][row]),
+                        int(positions['ply'][row])) == expected[index]
+    finally:
+        for leftover in (path, path + PLY_COUNTS_SUFFIX):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def plane_bit_board(plane):
+    return sum(square_bit((int(row), int(column))) for (row, column) in zip(*np.nonzero(plane)))
+
+
+def transformed_players_and_opponents_board(board_state, player_color, symmetry):
+    (black, white) = board_state.as_bit_boards()
+    if player_color == 'black':
+        return (transform(black, symmetry), transform(white, symmetry))
+    return (transform(white, symmetry), transform(black, symmetry))
+
+
+def training_data_sanity_check(games=4):
+    # Check every symmetry of every recorded position against BitBoard: the
+    # planes are the transformed position, the move label plays the
+    # transformed move, and the outcome labels are the final result for
+    # the side to move
+    game_moves = replayed_games(games)
+    (record_file, path) = tempfile.mkstemp()
+    os.close(record_file)
+    os.remove(path)
+    try:
+        with GameRecordWriter(path) as writer:
+            for moves in game_moves:
+                writer.append(moves)
+        reader = GameRecordReader(path)
+        (inputs, labels) = build_batch(reader.positions(np.arange(reader.position_count())),
+                                       augmentation=ALL_SYMMETRIES)
+    finally:
+        for leftover in (path, path + PLY_COUNTS_SUFFIX):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    samples = []
+    for moves in game_moves:
+        board_states = [BitBoard()]
+        for (player_color, move) in moves:
+            board_states.append(board_states[-1].next_board_state(move, player_color))
+        for (ply, (player_color, _)) in enumerate(moves):
+            samples.append((board_states[ply], player_color, board_states[ply + 1],
+                            board_states[-1].disc_difference(player_color)))
+    assert len(inputs) == SYMMETRY_NUM * len(samples)
+    for symmetry in range(SYMMETRY_NUM):
+        for (index, (board_state, player_color, next_state, disc_difference)) in enumerate(samples):
+            row = symmetry * len(samples) + index
+            (player, opponent) = transformed_players_and_opponents_board(board_state, player_color, symmetry)
+            assert plane_bit_board(inputs[row, PLAYER_PLANE]) == player
+            assert plane_bit_board(inputs[row, OPPONENT_PLANE]) == opponent
+            transformed_state = BitBoard(8, 8, player, opponent)
+            assert plane_bit_board(inputs[row, LEGAL_MOVES_PLANE]) == \
+                sum(square_bit(move) for move in transformed_state.list_all_valid_moves('black'))
+            move = (int(labels['move'][row]) // 8, int(labels['move'][row]) % 8)
+            assert transformed_state.next_board_state(move, 'black').as_bit_boards() == \
+                transformed_players_and_opponents_board(next_state, player_color, symmetry)
+            assert labels['disc_difference'][row] == disc_difference
+            assert labels['outcome'][row] == cmp(disc_difference, 0)
+
+
+def cached_evaluator_sanity_check(games=4):
+    # Check that CachedEvaluator returns the values of the evaluator it wraps,
+    # through hits, evictions, both lifetimes and canonical keys. The bit
+    # board evaluator scores symmetric positions alike, so canonical keys
+    # keep its values.
+    positions = replayed_positions(games)
+    bit_board_evaluator = BitBoardEvaluator()
+    for (capacity, lifetime, canonical) in ((1 << 16, PER_GAME, False), (16, PER_GAME, False),
+                                            (1 << 16, PER_SEARCH, False), (1 << 16, PER_GAME, True)):
+        cached_evaluator = CachedEvaluator(bit_board_evaluator, capacity, lifetime, canonical)
+        cached_evaluator.begin_game()
+        for _ in range(2):
+            cached_evaluator.begin_search()
+            cached_evaluator.reset_counters()
+            for (board_state, _, _) in positions:
+                for (color, other) in (('black', 'white'), ('white', 'black')):
+                    assert cached_evaluator.evaluate(board_state, color, other) == \
+                        bit_board_evaluator.evaluate(board_state, color, other)
+        # The second search hits every position only if the cache kept them all
+        assert (cached_evaluator.hits() == 2 * len(positions)) == \
+            (capacity >= 2 * len(positions) and lifetime == PER_GAME)
+
+
+def position_index_sanity_check(games=10, batch_size=100):
+    # Check that PositionIndex numbers positions in order of first appearance
+    # and counts them alike through add, add_bit_boards and add_batch, across
+    # resizes from a small capacity and a save and load
+    board_states = [board_state for (board_state, _, _) in replayed_positions(games)]
+    bit_boards = [board_state.as_bit_boards() for board_state in board_states]
+    blacks = np.array([black for (black, _) in bit_boards], dtype=np.uint64)
+    whites = np.array([white for (_, white) in bit_boards], dtype=np.uint64)
+    for canonical in (True, False):
+        index = PositionIndex(16, canonical=canonical)
+        bit_board_index = PositionIndex(16, canonical=canonical)
+        batch_index = PositionIndex(16, canonical=canonical)
+        first_ids = {}
+        position_ids = []
+        for (board_state, (black, white)) in zip(board_states, bit_boards):
+            key = index.key(board_state)
+            first_ids.setdefault(key, len(first_ids))
+            position_ids.append(first_ids[key])
+            assert index.add(board_state) == first_ids[key]
+            assert bit_board_index.add_bit_boards(black, white) == first_ids[key]
+        position_ids = np.array(position_ids)
+        for start in range(0, len(board_states), batch_size):
+            batch_ids = batch_index.add_batch(blacks[start:start + batch_size],
+                                              whites[start:start + batch_size])
+            assert np.array_equal(batch_ids, position_ids[start:start + batch_size])
+        assert batch_index.capacity() > 16 and len(batch_index) == len(first_ids)
+        counts = np.bincount(position_ids)
+        for other_index in (index, bit_board_index, batch_index):
+            assert np.array_equal(other_index.counts(), counts)
+        keys = sorted(first_ids, key=first_ids.get)
+        (position_blacks, position_whites) = batch_index.positions()
+        assert [(int(black), int(white)) for (black, white) in zip(position_blacks, position_whites)] == keys
+        (index_file, path) = tempfile.mkstemp()
+        os.close(index_file)
+        try:
+            batch_index.save(path)
+            loaded_index = PositionIndex.load(path)
+        finally:
+            os.remove(path)
+        assert np.array_equal(loaded_index.counts(), counts)
+        assert np.array_equal(loaded_index.lookup_batch(blacks, whites), position_ids)
+        assert all(loaded_index.position_id(board_state) == position_id
+                   for (board_state, position_id) in zip(board_states, position_ids))
+        # A position no game reaches is not found, and adding every position
+        # again resizes the loaded table without renumbering
+        assert loaded_index.lookup_batch([1], [2])[0] == EMPTY
+        assert loaded_index.add_batch([1], [2])[0] == len(first_ids)
+        loaded_index.reserve(4 * loaded_index.capacity())
+        assert np.array_equal(loaded_index.add_batch(blacks, whites), position_ids)
+        assert np.array_equal(loaded_index.counts()[:-1], 2 * counts)
+
 
 def algorithm_performance_test(board_state, evaluator, player_color, opponent_color, depth):
     logger = getLogger(__name__)
@@ -118,6 +559,18 @@ if __name__ == '__main__':
 
     logger.info("Running alogorithm sanity check")
     algorithm_sanity_check(evaluator, player_color, opponent_color, depth=4)
+    parallel_alpha_beta_sanity_check(evaluator, player_color, opponent_color, depth=4)
+    multi_prob_cut_sanity_check()
+    evaluator_sanity_check()
+    matrix_board_sanity_check()
+    opening_book_sanity_check()
+    transposition_table_sanity_check()
+    endgame_solver_sanity_check()
+    board_batch_sanity_check()
+    game_record_sanity_check()
+    training_data_sanity_check()
+    cached_evaluator_sanity_check()
+    position_index_sanity_check()
     logger.info("Sanity check done")
 
     logger.info("Running board performance check")
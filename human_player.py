@@ -8,13 +8,19 @@ class HumanPlayer(Player):
         self._board = board
         self._selected_move = None
         self._lock = threading.Condition()
+        self._killed = False
         self._logger = getLogger(__name__)
 
-    def select_move(self, board_state):
+    def new_game(self):
+        with self._lock:
+            self._killed = False
+
+    def select_move(self, board_state, time_budget=None):
         self._board.set_on_board_press_listener(self.on_board_pressed)
         try:
             with self._lock:
-                self._lock.wait()
+                if not self._killed:
+                    self._lock.wait()
         except Exception as e:
             self._logger.error("Exception occurred while waiting for player's move!")
         return self._selected_move
@@ -26,6 +32,8 @@ class HumanPlayer(Player):
             self._lock.notify_all()
 
     def force_kill(self):
+        # Also keeps a select_move that has not started waiting yet from blocking
         with self._lock:
+            self._killed = True
             self._lock.notify_all()
 
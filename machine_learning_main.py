@@ -2,6 +2,8 @@ from logging import getLogger, INFO, basicConfig
 from othello.engine import Engine
 from othello.ai.alpha_beta import AlphaBeta
 from othello.ai.evaluator import Evaluator
+from othello.game_record import GameRecordWriter, GameRecordReader
+from othello.training_data import TrainingDataPipeline
 from ai_player import AiPlayer
 
 
@@ -20,10 +22,20 @@ def play_one_episode():
     logger.info("Game finished! winner was: %s", winner)
     for board in transitions:
         logger.info("Game transitions:\n%s", board)
+    with GameRecordWriter('game_records.bin') as writer:
+        writer.append(othello_engine.move_history())
+
+
+def stream_training_batches():
+    logger = getLogger(__name__)
+    pipeline = TrainingDataPipeline(GameRecordReader('game_records.bin'), batch_size=32)
+    for (inputs, labels) in pipeline:
+        logger.info("Training batch: inputs %s, moves %s", inputs.shape, labels['move'])
 
 
 def main():
     play_one_episode()
+    stream_training_batches()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,23 @@
+import os
+from logging import getLogger, INFO, basicConfig
+from othello.ai.opening_book import OpeningBookBuilder
+from othello.ai.alpha_beta import AlphaBeta
+from othello.ai.bit_board_evaluator import BitBoardEvaluator
+from othello.game_record import GameRecordReader
+
+
+def main():
+    logger = getLogger(__name__)
+    if os.path.exists('self_play_games.bin'):
+        builder = OpeningBookBuilder(max_plies=12, min_count=2)
+        builder.add_game_records(GameRecordReader('self_play_games.bin'))
+    else:
+        builder = OpeningBookBuilder(max_plies=6)
+        builder.add_search_results(AlphaBeta(depth=4, make_unmake=True), BitBoardEvaluator())
+    entry_num = builder.write('opening_book.bin')
+    logger.info("Opening book built with %d positions", entry_num)
+
+
+if __name__ == '__main__':
+    basicConfig(level=INFO)
+    main()
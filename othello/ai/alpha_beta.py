@@ -1,66 +1,170 @@
 from logging import getLogger
-from search_algorithm import SearchAlgorithm
+from search_algorithm import SearchAlgorithm, SearchCancelled
+from transposition_table import EXACT, LOWER_BOUND, UPPER_BOUND
 
 
 NEGATIVE_INFINITY = float('-infinity')
 POSITIVE_INFINITY = float('infinity')
 
 class AlphaBeta(SearchAlgorithm):
-    def __init__(self, depth=4):
+    def __init__(self, depth=4, transposition_table=None, make_unmake=False, move_ordering=None):
         super(AlphaBeta, self).__init__()
         self._logger = getLogger(__name__)
         self._depth = depth
+        self._transposition_table = transposition_table
+        self._make_unmake = make_unmake
+        self._move_ordering = move_ordering
+        self._root_depth = depth
+
+    def transposition_table(self):
+        return self._transposition_table
 
     def search_optimal_move(self, board_state, state_evaluator, player_color, opponent_color):
-        depth = self._depth
+        if self._move_ordering is not None:
+            self._move_ordering.new_search()
         valid_moves = board_state.list_all_valid_moves(player_color)
+        (best_move, _) = self.search_root(board_state, state_evaluator,
+                                          player_color, opponent_color,
+                                          valid_moves, self._depth)
+        if self._statistics is not None:
+            self._statistics.complete_depth(self._depth)
+        return best_move
+
+    def search_root(self, board_state, state_evaluator,
+                    player_color, opponent_color,
+                    valid_moves, depth):
         best_value = NEGATIVE_INFINITY
         best_move = valid_moves[0]
         search_depth = depth
+        self._root_depth = depth
         alpha = NEGATIVE_INFINITY
         beta = POSITIVE_INFINITY
         for move in valid_moves:
             self._logger.debug('searching for move: ' + str(move))
-            next_state = board_state.next_board_state(move, player_color)
-            value = self.alpha_beta_search(next_state, state_evaluator,
-                                           player_color, opponent_color,
-                                           alpha, beta,
-                                           search_depth, False)
+            value = self.search_child(board_state, move, player_color, state_evaluator,
+                                      player_color, opponent_color,
+                                      alpha, beta,
+                                      search_depth, False)
             if best_value < value:
                 best_value = value
                 best_move = move
             self._logger.debug('searched for move: ' + str(move) + ' best value: ' + str(best_value))
             alpha = max(alpha, best_value)
-        return best_move
+        return (best_move, best_value)
+
+    def search_child(self, board_state, move, move_color, state_evaluator,
+                     player_color, opponent_color,
+                     alpha, beta,
+                     depth, maximize):
+        if not self._make_unmake:
+            next_state = board_state.next_board_state(move, move_color)
+            return self.alpha_beta_search(next_state, state_evaluator,
+                                          player_color, opponent_color,
+                                          alpha, beta,
+                                          depth, maximize)
+        undo_info = board_state.make_move(move, move_color)
+        try:
+            return self.alpha_beta_search(board_state, state_evaluator,
+                                          player_color, opponent_color,
+                                          alpha, beta,
+                                          depth, maximize)
+        finally:
+            board_state.undo_move(move, undo_info, move_color)
 
     def alpha_beta_search(self, board_state, state_evaluator,
                           player_color, opponent_color,
                           alpha, beta,
                           depth, maximize):
-        if depth == 0 or board_state.is_end_state():
+        if self._stop_event.is_set():
+            raise SearchCancelled()
+        statistics = self._statistics
+        if statistics is not None:
+            statistics.nodes += 1
+        if depth == 0:
+            if statistics is not None:
+                statistics.leaf_evaluations += 1
             return state_evaluator.evaluate(board_state, player_color, opponent_color)
 
-        if not board_state.has_valid_move(player_color if maximize else opponent_color):
+        color = player_color if maximize else opponent_color
+        table = self._transposition_table
+        table_move = None
+        if table is not None:
+            key = table.hash_key(board_state, color)
+            entry = table.lookup(key)
+            if entry is not None:
+                table_move = entry[4]
+                if statistics is not None:
+                    statistics.table_hits += 1
+            if entry is not None and entry[1] >= depth:
+                value = entry[2]
+                bound = entry[3]
+                if bound == EXACT:
+                    return value
+                elif bound == LOWER_BOUND:
+                    alpha = max(alpha, value)
+                else:
+                    beta = min(beta, value)
+                if beta <= alpha:
+                    return value
+            original_alpha = alpha
+            original_beta = beta
+
+        if board_state.is_end_state():
+            if statistics is not None:
+                statistics.leaf_evaluations += 1
+            return state_evaluator.evaluate(board_state, player_color, opponent_color)
+
+        if not board_state.has_valid_move(color):
             return self.alpha_beta_search(
                 board_state, state_evaluator, player_color, opponent_color, alpha, beta, depth - 1, not maximize)
 
+        moves = board_state.list_all_valid_moves(color)
+        ordering = self._move_ordering
+        if ordering is not None:
+            moves = ordering.order_moves(moves, color, self._root_depth - depth, table_move)
+        elif table_move is not None and table_move in moves:
+            # Best move from an earlier or shallower search goes first
+            moves.remove(table_move)
+            moves.insert(0, table_move)
+
+        best_move = None
         if maximize:
             best_value = NEGATIVE_INFINITY
-            next_states = board_state.list_all_next_states(player_color)
-            for next_state in next_states:
-                best_value = max(best_value, self.alpha_beta_search(
-                    next_state, state_evaluator, player_color, opponent_color, alpha, beta, depth - 1, False))
+            for (index, move) in enumerate(moves):
+                value = self.search_child(
+                    board_state, move, player_color, state_evaluator, player_color, opponent_color, alpha, beta, depth - 1, False)
+                if best_value < value:
+                    best_value = value
+                    best_move = move
                 alpha = max(alpha, best_value)
                 if beta <= alpha:
+                    if statistics is not None:
+                        statistics.beta_cutoffs += 1
+                    if ordering is not None:
+                        ordering.record_cutoff(move, color, self._root_depth - depth, depth, index)
                     break
-            return best_value
         else:
             best_value = POSITIVE_INFINITY
-            next_states = board_state.list_all_next_states(opponent_color)
-            for next_state in next_states:
-                best_value = min(best_value, self.alpha_beta_search(
-                    next_state, state_evaluator, player_color, opponent_color, alpha, beta, depth - 1, True))
+            for (index, move) in enumerate(moves):
+                value = self.search_child(
+                    board_state, move, opponent_color, state_evaluator, player_color, opponent_color, alpha, beta, depth - 1, True)
+                if value < best_value:
+                    best_value = value
+                    best_move = move
                 beta = min(beta, best_value)
                 if beta <= alpha:
+                    if statistics is not None:
+                        statistics.beta_cutoffs += 1
+                    if ordering is not None:
+                        ordering.record_cutoff(move, color, self._root_depth - depth, depth, index)
                     break
-            return best_value
+
+        if table is not None:
+            if best_value <= original_alpha:
+                bound = UPPER_BOUND
+            elif best_value >= original_beta:
+                bound = LOWER_BOUND
+            else:
+                bound = EXACT
+            table.store(key, depth, best_value, bound, best_move)
+        return best_value
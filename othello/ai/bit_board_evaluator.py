@@ -0,0 +1,51 @@
+from evaluator import Evaluator, POSITION_VALUES
+from ..bit_board import mobility_mask, popcount
+
+
+def build_row_value_tables(position_values):
+    # Byte i of a bit board holds row (7 - i), its bit j column (7 - j)
+    (rows, columns) = position_values.shape
+    tables = []
+    for byte_index in range(rows):
+        row = rows - byte_index - 1
+        table = []
+        for byte in range(256):
+            value = 0
+            for bit in range(columns):
+                if (byte >> bit) & 1:
+                    value += int(position_values[row, columns - bit - 1])
+            table.append(value)
+        tables.append(table)
+    return tables
+
+
+ROW_VALUE_TABLES = build_row_value_tables(POSITION_VALUES)
+
+
+# Same score as Evaluator, computed from the two bit boards without
+# building a numpy matrix or move lists.
+class BitBoardEvaluator(Evaluator):
+    def __init__(self):
+        super(BitBoardEvaluator, self).__init__()
+
+    def evaluate(self, board_state, player_color, opponent_color):
+        (black, white) = board_state.as_bit_boards()
+        if player_color == 'black':
+            (player, opponent) = (black, white)
+        else:
+            (player, opponent) = (white, black)
+        board_value = self.position_value(player) - self.position_value(opponent)
+        move_num_difference = popcount(mobility_mask(player, opponent)) - \
+            popcount(mobility_mask(opponent, player))
+        return move_num_difference * 0.1 + board_value
+
+    def position_value(self, bit_board):
+        tables = ROW_VALUE_TABLES
+        return tables[0][bit_board & 0xff] + \
+            tables[1][(bit_board >> 8) & 0xff] + \
+            tables[2][(bit_board >> 16) & 0xff] + \
+            tables[3][(bit_board >> 24) & 0xff] + \
+            tables[4][(bit_board >> 32) & 0xff] + \
+            tables[5][(bit_board >> 40) & 0xff] + \
+            tables[6][(bit_board >> 48) & 0xff] + \
+            tables[7][(bit_board >> 56) & 0xff]
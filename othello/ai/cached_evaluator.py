@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from evaluator import Evaluator
+
+PER_SEARCH = 'per_search'
+PER_GAME = 'per_game'
+
+
+# Memoizes another evaluator on (black, white, player_color). The cache holds
+# at most capacity positions and evicts the least recently used one; it is
+# emptied at the start of every search or every game depending on lifetime.
+# With canonical=True symmetric positions share an entry, which is only
+# correct for evaluators that score symmetric positions alike.
+class CachedEvaluator(Evaluator):
+    def __init__(self, evaluator, capacity=1 << 16, lifetime=PER_GAME, canonical=False):
+        super(CachedEvaluator, self).__init__()
+        assert capacity > 0
+        assert lifetime in (PER_SEARCH, PER_GAME)
+        self._evaluator = evaluator
+        self._capacity = capacity
+        self._lifetime = lifetime
+        self._canonical = canonical
+        self._cache = OrderedDict()
+        self.reset_counters()
+
+    def evaluate(self, board_state, player_color, opponent_color):
+        if self._canonical:
+            (black, white) = board_state.canonical_key()
+        else:
+            (black, white) = board_state.as_bit_boards()
+        key = (black, white, player_color)
+        cache = self._cache
+        value = cache.pop(key, None)
+        if value is not None:
+            self._hits += 1
+        else:
+            self._misses += 1
+            value = self._evaluator.evaluate(board_state, player_color, opponent_color)
+            if len(cache) >= self._capacity:
+                cache.popitem(last=False)
+                self._evictions += 1
+        # Reinserting moves the position to the most recently used end
+        cache[key] = value
+        return value
+
+    def begin_search(self):
+        self._evaluator.begin_search()
+        if self._lifetime == PER_SEARCH:
+            self.clear()
+
+    def begin_game(self):
+        self._evaluator.begin_game()
+        self.clear()
+
+    def clear(self):
+        self._cache.clear()
+
+    def reset_counters(self):
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def capacity(self):
+        return self._capacity
+
+    def hits(self):
+        return self._hits
+
+    def misses(self):
+        return self._misses
+
+    def hit_rate(self):
+        probes = self._hits + self._misses
+        return float(self._hits) / probes if probes != 0 else 0.0
+
+    def statistics(self):
+        return {'capacity': self._capacity,
+                'used': len(self._cache),
+                'lifetime': self._lifetime,
+                'canonical': self._canonical,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self.hit_rate(),
+                'evictions': self._evictions}
@@ -0,0 +1,204 @@
+from logging import getLogger
+from search_algorithm import SearchAlgorithm, SearchCancelled
+from ..bit_board import FULL_MASK, mobility_mask, flip_pattern, popcount
+
+EXACT_SCORE = 'exact'
+WIN_LOSS_DRAW = 'win_loss_draw'
+# Square numbering and disc counts assume the standard board
+ENDGAME_SOLVER_SHAPE = (8, 8)
+
+QUADRANT_MASKS = (0xf0f0f0f000000000, 0x0f0f0f0f00000000,
+                  0x00000000f0f0f0f0, 0x000000000f0f0f0f)
+
+
+def square_bit(move):
+    (row, column) = move
+    return 1 << ((7 - row) * 8 + (7 - column))
+
+
+def bit_move(bit):
+    index = bit.bit_length() - 1
+    return (7 - index // 8, 7 - index % 8)
+
+
+def odd_quadrants(empty_board):
+    odd = 0
+    for mask in QUADRANT_MASKS:
+        if popcount(empty_board & mask) & 1:
+            odd |= mask
+    return odd
+
+
+# Scores are final disc differences (own discs minus opponent discs) seen
+# from the side to move. In win/loss/draw mode only their sign is exact.
+class EndgameSolver(SearchAlgorithm):
+    def __init__(self, mode=EXACT_SCORE, fastest_first_empties=7):
+        super(EndgameSolver, self).__init__()
+        assert mode in (EXACT_SCORE, WIN_LOSS_DRAW)
+        self._logger = getLogger(__name__)
+        self._mode = mode
+        self._fastest_first_empties = fastest_first_empties
+        self._last_score = None
+
+    def last_score(self):
+        return self._last_score
+
+    def search_optimal_move(self, board_state, state_evaluator, player_color, opponent_color):
+        (best_move, _) = self.solve(board_state, player_color)
+        return best_move
+
+    def solve(self, board_state, player_color):
+        if board_state.shape != ENDGAME_SOLVER_SHAPE:
+            raise ValueError('EndgameSolver only solves 8x8 boards: ' + str(board_state.shape))
+        (black, white) = board_state.as_bit_boards()
+        if player_color == 'black':
+            (player, opponent) = (black, white)
+        else:
+            (player, opponent) = (white, black)
+        if self._mode == WIN_LOSS_DRAW:
+            (alpha, beta) = (-1, 1)
+        else:
+            (alpha, beta) = (-64, 64)
+        valid_moves = board_state.list_all_valid_moves(player_color)
+        best_move = valid_moves[0]
+        best_score = -65
+        for move in valid_moves:
+            move_bit = square_bit(move)
+            flips = flip_pattern(player, opponent, move_bit)
+            score = -self.solve_position(opponent ^ flips, player | move_bit | flips,
+                                         -beta, -max(alpha, best_score), False)
+            self._logger.debug('solved move: ' + str(move) + ' score: ' + str(score))
+            if best_score < score:
+                best_score = score
+                best_move = move
+                if beta <= best_score:
+                    break
+        self._last_score = best_score
+        if self._statistics is not None:
+            self._statistics.complete_depth(popcount(~(player | opponent) & FULL_MASK))
+        return (best_move, best_score)
+
+    def solve_position(self, player, opponent, alpha, beta, passed):
+        if self._stop_event.is_set():
+            raise SearchCancelled()
+        statistics = self._statistics
+        if statistics is not None:
+            statistics.nodes += 1
+        empty_board = ~(player | opponent) & FULL_MASK
+        empties = popcount(empty_board)
+        if empties == 1:
+            return self.solve_1(player, opponent, empty_board)
+        if empties == 2:
+            return self.solve_2(player, opponent, alpha, beta, empty_board, False)
+        if empties <= 4:
+            return self.solve_few(player, opponent, alpha, beta, empty_board, False)
+
+        moves = mobility_mask(player, opponent)
+        if moves == 0:
+            if passed:
+                return self.final_score(player, opponent)
+            return -self.solve_position(opponent, player, -beta, -alpha, True)
+
+        best_score = -65
+        for (move_bit, flips) in self.ordered_moves(player, opponent, moves, empty_board, empties):
+            score = -self.solve_position(opponent ^ flips, player | move_bit | flips,
+                                         -beta, -max(alpha, best_score), False)
+            if best_score < score:
+                best_score = score
+                if beta <= best_score:
+                    if statistics is not None:
+                        statistics.beta_cutoffs += 1
+                    break
+        return best_score
+
+    def ordered_moves(self, player, opponent, moves, empty_board, empties):
+        children = []
+        if empties > self._fastest_first_empties:
+            # Fastest first: leave the opponent as few replies as possible
+            while moves:
+                move_bit = moves & -moves
+                moves ^= move_bit
+                flips = flip_pattern(player, opponent, move_bit)
+                next_opponent = opponent ^ flips
+                replies = popcount(mobility_mask(next_opponent, player | move_bit | flips))
+                children.append((replies, move_bit, flips))
+        else:
+            # Parity: play into regions with an odd number of empties first
+            odd = odd_quadrants(empty_board)
+            while moves:
+                move_bit = moves & -moves
+                moves ^= move_bit
+                children.append((0 if move_bit & odd else 1, move_bit,
+                                 flip_pattern(player, opponent, move_bit)))
+        children.sort(key=lambda child: child[0])
+        return [(move_bit, flips) for (_, move_bit, flips) in children]
+
+    def solve_few(self, player, opponent, alpha, beta, empty_board, passed):
+        odd = odd_quadrants(empty_board)
+        squares = []
+        remaining = empty_board
+        while remaining:
+            move_bit = remaining & -remaining
+            remaining ^= move_bit
+            if move_bit & odd:
+                squares.insert(0, move_bit)
+            else:
+                squares.append(move_bit)
+
+        best_score = -65
+        for move_bit in squares:
+            flips = flip_pattern(player, opponent, move_bit)
+            if flips == 0:
+                continue
+            next_player = opponent ^ flips
+            next_opponent = player | move_bit | flips
+            next_empty_board = empty_board ^ move_bit
+            if len(squares) == 4:
+                score = -self.solve_few(next_player, next_opponent,
+                                        -beta, -max(alpha, best_score), next_empty_board, False)
+            else:
+                score = -self.solve_2(next_player, next_opponent,
+                                      -beta, -max(alpha, best_score), next_empty_board, False)
+            if best_score < score:
+                best_score = score
+                if beta <= best_score:
+                    return best_score
+        if best_score == -65:
+            if passed:
+                return self.final_score(player, opponent)
+            return -self.solve_few(opponent, player, -beta, -alpha, empty_board, True)
+        return best_score
+
+    def solve_2(self, player, opponent, alpha, beta, empty_board, passed):
+        first = empty_board & -empty_board
+        second = empty_board ^ first
+        best_score = -65
+        flips = flip_pattern(player, opponent, first)
+        if flips != 0:
+            best_score = -self.solve_1(opponent ^ flips, player | first | flips, second)
+            if beta <= best_score:
+                return best_score
+        flips = flip_pattern(player, opponent, second)
+        if flips != 0:
+            score = -self.solve_1(opponent ^ flips, player | second | flips, first)
+            if best_score < score:
+                best_score = score
+        if best_score == -65:
+            if passed:
+                return self.final_score(player, opponent)
+            return -self.solve_2(opponent, player, -beta, -alpha, empty_board, True)
+        return best_score
+
+    def solve_1(self, player, opponent, empty_board):
+        # 63 discs are on the board, so the difference follows from the flips
+        score = popcount(player) * 2 - 63
+        flips = flip_pattern(player, opponent, empty_board)
+        if flips != 0:
+            return score + 2 * popcount(flips) + 1
+        flips = flip_pattern(opponent, player, empty_board)
+        if flips != 0:
+            return score - 2 * popcount(flips) - 1
+        return score
+
+    def final_score(self, player, opponent):
+        return popcount(player) - popcount(opponent)
@@ -15,6 +15,12 @@ class Evaluator(object):
     def __init__(self):
         pass
 
+    def begin_search(self):
+        pass
+
+    def begin_game(self):
+        pass
+
     def evaluate(self, board_state, player_color, opponent_color):
         player_move_num = len(board_state.list_all_valid_moves(player_color))
         opponent_move_num = len(
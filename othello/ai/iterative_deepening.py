@@ -0,0 +1,75 @@
+import time
+from logging import getLogger
+from alpha_beta import AlphaBeta
+from search_algorithm import SearchCancelled
+from transposition_table import TranspositionTable
+from move_ordering import MoveOrdering
+
+
+class SearchTimeout(SearchCancelled):
+    pass
+
+
+# Unlike the other searches, a stopped or timed out search returns the best
+# move of its last completed depth instead of raising SearchCancelled.
+class IterativeDeepening(AlphaBeta):
+    def __init__(self, time_budget=1.0, max_depth=60, transposition_table=None, make_unmake=False,
+                 move_ordering=None):
+        if transposition_table is None:
+            transposition_table = TranspositionTable()
+        if move_ordering is None:
+            move_ordering = MoveOrdering()
+        super(IterativeDeepening, self).__init__(depth=max_depth,
+                                                 transposition_table=transposition_table,
+                                                 make_unmake=make_unmake,
+                                                 move_ordering=move_ordering)
+        self._logger = getLogger(__name__)
+        self._time_budget = time_budget
+        self._deadline = None
+        self._completed_depth = None
+
+    def set_time_budget(self, time_budget):
+        self._time_budget = time_budget
+
+    def time_budget(self):
+        return self._time_budget
+
+    def completed_depth(self):
+        return self._completed_depth
+
+    def search_optimal_move(self, board_state, state_evaluator, player_color, opponent_color):
+        self._deadline = time.time() + self._time_budget
+        self._completed_depth = None
+        self._move_ordering.new_search()
+        valid_moves = board_state.list_all_valid_moves(player_color)
+        best_move = valid_moves[0]
+        if len(valid_moves) == 1:
+            return best_move
+        # The game cannot last longer than the number of empty squares
+        max_depth = min(self._depth, len(board_state.list_all_empty_positions()))
+        for depth in range(max_depth + 1):
+            try:
+                (best_move, best_value) = self.search_root(board_state, state_evaluator,
+                                                           player_color, opponent_color,
+                                                           valid_moves, depth)
+            except SearchCancelled:
+                break
+            self._completed_depth = depth
+            if self._statistics is not None:
+                self._statistics.complete_depth(depth)
+            self._logger.debug('completed depth: ' + str(depth) + ' best move: ' +
+                               str(best_move) + ' best value: ' + str(best_value))
+            valid_moves.remove(best_move)
+            valid_moves.insert(0, best_move)
+        return best_move
+
+    def alpha_beta_search(self, board_state, state_evaluator,
+                          player_color, opponent_color,
+                          alpha, beta,
+                          depth, maximize):
+        if time.time() >= self._deadline:
+            raise SearchTimeout()
+        return super(IterativeDeepening, self).alpha_beta_search(board_state, state_evaluator,
+                                                                 player_color, opponent_color,
+                                                                 alpha, beta,
+                                                                 depth, maximize)
@@ -1,10 +1,13 @@
-from search_algorithm import SearchAlgorithm
+from search_algorithm import SearchAlgorithm, SearchCancelled
+from transposition_table import EXACT
 
 
 class MiniMax(SearchAlgorithm):
-    def __init__(self,  depth = 4):
+    def __init__(self,  depth = 4, transposition_table=None, make_unmake=False):
         super(MiniMax, self).__init__()
         self._depth = depth
+        self._transposition_table = transposition_table
+        self._make_unmake = make_unmake
 
     def search_optimal_move(self, board_state, state_evaluator, player_color, opponent_color):
         valid_moves = board_state.list_all_valid_moves(player_color)
@@ -12,36 +15,77 @@ class MiniMax(SearchAlgorithm):
         best_move = valid_moves[0]
         search_depth = self._depth
         for move in valid_moves:
-            next_state = board_state.next_board_state(move, player_color)
-            value = self.minimax_search(
-                next_state, state_evaluator, player_color, opponent_color, search_depth, False)
+            value = self.search_child(
+                board_state, move, player_color, state_evaluator, player_color, opponent_color, search_depth, False)
             if best_value < value:
                 best_value = value
                 best_move = move
+        if self._statistics is not None:
+            self._statistics.complete_depth(search_depth)
         return best_move
 
+    def search_child(self, board_state, move, move_color, state_evaluator,
+                     player_color, opponent_color, depth, maximize):
+        if not self._make_unmake:
+            next_state = board_state.next_board_state(move, move_color)
+            return self.minimax_search(
+                next_state, state_evaluator, player_color, opponent_color, depth, maximize)
+        undo_info = board_state.make_move(move, move_color)
+        try:
+            return self.minimax_search(
+                board_state, state_evaluator, player_color, opponent_color, depth, maximize)
+        finally:
+            board_state.undo_move(move, undo_info, move_color)
+
     def minimax_search(self, board_state, state_evaluator,
                        player_color, opponent_color, depth, maximize):
-        if depth == 0 or board_state.is_end_state():
+        if self._stop_event.is_set():
+            raise SearchCancelled()
+        statistics = self._statistics
+        if statistics is not None:
+            statistics.nodes += 1
+        if depth == 0:
+            if statistics is not None:
+                statistics.leaf_evaluations += 1
             return state_evaluator.evaluate(board_state, player_color, opponent_color)
 
-        if not board_state.has_valid_move(player_color if maximize else opponent_color):
+        color = player_color if maximize else opponent_color
+        table = self._transposition_table
+        if table is not None:
+            key = table.hash_key(board_state, color)
+            entry = table.lookup(key)
+            if entry is not None and entry[1] >= depth and entry[3] == EXACT:
+                if statistics is not None:
+                    statistics.table_hits += 1
+                return entry[2]
+
+        if board_state.is_end_state():
+            if statistics is not None:
+                statistics.leaf_evaluations += 1
+            return state_evaluator.evaluate(board_state, player_color, opponent_color)
+
+        if not board_state.has_valid_move(color):
             return self.minimax_search(
                 board_state, state_evaluator, player_color, opponent_color, depth - 1, not maximize)
 
+        best_move = None
         if maximize:
             best_value = float('-infinity')
-            next_states = board_state.list_all_next_states(player_color)
-            for next_state in next_states:
-                value = self.minimax_search(
-                    next_state, state_evaluator, player_color, opponent_color, depth - 1, False)
-                best_value = max(best_value, value)
-            return best_value
+            for move in board_state.list_all_valid_moves(player_color):
+                value = self.search_child(
+                    board_state, move, player_color, state_evaluator, player_color, opponent_color, depth - 1, False)
+                if best_value < value:
+                    best_value = value
+                    best_move = move
         else:
             best_value = float('infinity')
-            next_states = board_state.list_all_next_states(opponent_color)
-            for next_state in next_states:
-                value = self.minimax_search(
-                    next_state, state_evaluator, player_color, opponent_color, depth - 1, True)
-                best_value = min(best_value, value)
-            return best_value
+            for move in board_state.list_all_valid_moves(opponent_color):
+                value = self.search_child(
+                    board_state, move, opponent_color, state_evaluator, player_color, opponent_color, depth - 1, True)
+                if value < best_value:
+                    best_value = value
+                    best_move = move
+
+        if table is not None:
+            table.store(key, depth, best_value, EXACT, best_move)
+        return best_value
@@ -0,0 +1,209 @@
+import math
+import random
+import time
+import numpy as np
+from logging import getLogger
+from search_algorithm import SearchAlgorithm, SearchCancelled
+from endgame_solver import bit_move
+from ..bit_board import mobility_mask, flip_pattern, popcount
+from ..board_batch import random_playouts
+from .. import utilities
+
+PASS = 0
+# Playouts and moves use the 8x8 bit board layout
+MONTE_CARLO_SHAPE = (8, 8)
+
+
+def random_playout(player_board, opponent_board, random_generator):
+    # Final disc difference for the side to move after uniformly random play
+    sign = 1
+    passed = False
+    while True:
+        moves = mobility_mask(player_board, opponent_board)
+        if moves == 0:
+            if passed:
+                break
+            passed = True
+        else:
+            passed = False
+            move_bits = []
+            while moves:
+                move_bit = moves & -moves
+                moves ^= move_bit
+                move_bits.append(move_bit)
+            move_bit = random_generator.choice(move_bits)
+            flips = flip_pattern(player_board, opponent_board, move_bit)
+            player_board |= move_bit | flips
+            opponent_board ^= flips
+        (player_board, opponent_board) = (opponent_board, player_board)
+        sign = -sign
+    return sign * (popcount(player_board) - popcount(opponent_board))
+
+
+def playout_score(disc_difference):
+    if disc_difference > 0:
+        return 1.0
+    if disc_difference < 0:
+        return 0.0
+    return 0.5
+
+
+# wins are counted for the player who moved into the node, which is what
+# its parent compares children by.
+class MonteCarloNode(object):
+    def __init__(self, player_board, opponent_board, player_color, move_bit=None, parent=None):
+        self.player_board = player_board
+        self.opponent_board = opponent_board
+        self.player_color = player_color
+        self.move_bit = move_bit
+        self.parent = parent
+        self.children = []
+        self.visits = 0
+        self.wins = 0.0
+        moves = mobility_mask(player_board, opponent_board)
+        self.untried_moves = []
+        while moves:
+            move_bit = moves & -moves
+            moves ^= move_bit
+            self.untried_moves.append(move_bit)
+        if not self.untried_moves and mobility_mask(opponent_board, player_board) != 0:
+            self.untried_moves.append(PASS)
+
+    def is_position(self, player_board, opponent_board, player_color):
+        return self.player_board == player_board and self.opponent_board == opponent_board and \
+            self.player_color == player_color
+
+    def expand(self, move_bit):
+        flips = flip_pattern(self.player_board, self.opponent_board, move_bit) if move_bit else 0
+        child = MonteCarloNode(self.opponent_board ^ flips,
+                               self.player_board | move_bit | flips,
+                               utilities.opponent_color(self.player_color),
+                               move_bit, self)
+        self.children.append(child)
+        return child
+
+
+# UCT search with random playouts. Each iteration selects and expands
+# rollout_batch_size leaves, counting their visits on the way down so that
+# the leaves of one batch spread over the tree, then plays them out at once.
+class MonteCarloTreeSearch(SearchAlgorithm):
+    def __init__(self, playouts=1000, time_budget=None, exploration=math.sqrt(2),
+                 rollout_batch_size=1, reuse_tree=True, seed=None):
+        super(MonteCarloTreeSearch, self).__init__()
+        assert playouts is not None or time_budget is not None
+        self._logger = getLogger(__name__)
+        self._playouts = playouts
+        self._time_budget = time_budget
+        self._exploration = exploration
+        self._rollout_batch_size = rollout_batch_size
+        self._reuse_tree = reuse_tree
+        self._random = random.Random(seed)
+        self._random_state = np.random.RandomState(seed)
+        self._root = None
+
+    def set_time_budget(self, time_budget):
+        self._time_budget = time_budget
+
+    def time_budget(self):
+        return self._time_budget
+
+    def root(self):
+        return self._root
+
+    def search_optimal_move(self, board_state, state_evaluator, player_color, opponent_color):
+        if board_state.shape != MONTE_CARLO_SHAPE:
+            raise ValueError('MonteCarloTreeSearch only searches 8x8 boards: ' + str(board_state.shape))
+        root = self.root_for(board_state, player_color)
+        deadline = None
+        if self._time_budget is not None:
+            deadline = time.time() + self._time_budget
+        playouts = 0
+        max_depth = 0
+        while self._playouts is None or playouts < self._playouts:
+            if self._stop_event.is_set():
+                raise SearchCancelled()
+            if deadline is not None and playouts > 0 and time.time() >= deadline:
+                break
+            leaves = []
+            for _ in range(self._rollout_batch_size):
+                (leaf, depth) = self.select_leaf(root)
+                leaves.append(leaf)
+                max_depth = max(max_depth, depth)
+            for (leaf, disc_difference) in zip(leaves, self.play_out(leaves)):
+                self.backpropagate(leaf, playout_score(disc_difference))
+            playouts += len(leaves)
+        best_child = max(root.children, key=lambda child: child.visits)
+        self._logger.debug('playouts: ' + str(playouts) + ' best move visits: ' +
+                           str(best_child.visits) + ' win rate: ' +
+                           str(best_child.wins / best_child.visits))
+        if self._statistics is not None:
+            self._statistics.leaf_evaluations += playouts
+            self._statistics.complete_depth(max_depth)
+        self._root = root if self._reuse_tree else None
+        return bit_move(best_child.move_bit)
+
+    def root_for(self, board_state, player_color):
+        (black, white) = board_state.as_bit_boards()
+        if player_color == 'black':
+            (player_board, opponent_board) = (black, white)
+        else:
+            (player_board, opponent_board) = (white, black)
+        # The new position is usually the old root or two plies below it
+        if self._root is not None:
+            candidates = [self._root]
+            for child in self._root.children:
+                candidates.append(child)
+                candidates.extend(child.children)
+            for node in candidates:
+                if node.is_position(player_board, opponent_board, player_color):
+                    node.parent = None
+                    node.move_bit = None
+                    return node
+        return MonteCarloNode(player_board, opponent_board, player_color)
+
+    def select_leaf(self, root):
+        node = root
+        node.visits += 1
+        depth = 0
+        while not node.untried_moves and node.children:
+            node = self.select_child(node)
+            node.visits += 1
+            depth += 1
+        if node.untried_moves:
+            index = self._random.randrange(len(node.untried_moves))
+            node.untried_moves[index], node.untried_moves[-1] = \
+                node.untried_moves[-1], node.untried_moves[index]
+            node = node.expand(node.untried_moves.pop())
+            node.visits += 1
+            depth += 1
+            if self._statistics is not None:
+                self._statistics.nodes += 1
+        return (node, depth)
+
+    def select_child(self, node):
+        log_visits = math.log(node.visits)
+        exploration = self._exploration
+        best_child = None
+        best_value = None
+        for child in node.children:
+            value = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if best_child is None or best_value < value:
+                best_child = child
+                best_value = value
+        return best_child
+
+    def play_out(self, leaves):
+        if len(leaves) == 1:
+            leaf = leaves[0]
+            return [random_playout(leaf.player_board, leaf.opponent_board, self._random)]
+        return random_playouts([leaf.player_board for leaf in leaves],
+                               [leaf.opponent_board for leaf in leaves],
+                               self._random_state)
+
+    def backpropagate(self, leaf, score):
+        # score is the playout result for the side to move at the leaf
+        node = leaf
+        while node is not None:
+            node.wins += 1.0 - score
+            score = 1.0 - score
+            node = node.parent
@@ -0,0 +1,74 @@
+from evaluator import POSITION_VALUES
+
+(ROWS, COLUMNS) = POSITION_VALUES.shape
+STATIC_PRIORITY = dict(((x, y), int(POSITION_VALUES[x, y]))
+                       for x in range(ROWS) for y in range(COLUMNS))
+
+TABLE_MOVE_CLASS = 2
+KILLER_MOVE_CLASS = 1
+QUIET_MOVE_CLASS = 0
+
+
+class MoveOrdering(object):
+    def __init__(self, killer_slots=2, use_history=True, use_static_priority=True):
+        self._killer_slots = killer_slots
+        self._use_history = use_history
+        self._use_static_priority = use_static_priority
+        self._killers = {}
+        self._history = {'black': {}, 'white': {}}
+        self.reset_counters()
+
+    def new_search(self):
+        self._killers = {}
+        # Keep what was learned in the previous search but let it fade
+        for color_history in self._history.values():
+            for move in color_history:
+                color_history[move] //= 2
+
+    def order_moves(self, moves, player_color, ply, table_move=None):
+        killers = self._killers.get(ply, ())
+        history = self._history[player_color] if self._use_history else {}
+        use_static_priority = self._use_static_priority
+        killer_slots = self._killer_slots
+
+        def priority(move):
+            if move == table_move:
+                return (TABLE_MOVE_CLASS, 0, 0, 0)
+            if move in killers:
+                return (KILLER_MOVE_CLASS, killer_slots - killers.index(move), 0, 0)
+            static = STATIC_PRIORITY.get(move, 0) if use_static_priority else 0
+            return (QUIET_MOVE_CLASS, 0, history.get(move, 0), static)
+        return sorted(moves, key=priority, reverse=True)
+
+    def record_cutoff(self, move, player_color, ply, depth, move_index):
+        self._cutoffs += 1
+        if move_index == 0:
+            self._first_move_cutoffs += 1
+        killers = self._killers.setdefault(ply, [])
+        if move in killers:
+            killers.remove(move)
+        killers.insert(0, move)
+        del killers[self._killer_slots:]
+        if self._use_history:
+            history = self._history[player_color]
+            history[move] = history.get(move, 0) + depth * depth
+
+    def reset_counters(self):
+        self._cutoffs = 0
+        self._first_move_cutoffs = 0
+
+    def cutoffs(self):
+        return self._cutoffs
+
+    def first_move_cutoffs(self):
+        return self._first_move_cutoffs
+
+    def first_move_cutoff_rate(self):
+        if self._cutoffs == 0:
+            return 0.0
+        return float(self._first_move_cutoffs) / self._cutoffs
+
+    def statistics(self):
+        return {'cutoffs': self._cutoffs,
+                'first_move_cutoffs': self._first_move_cutoffs,
+                'first_move_cutoff_rate': self.first_move_cutoff_rate()}
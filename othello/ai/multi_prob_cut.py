@@ -0,0 +1,201 @@
+import json
+import numpy as np
+from logging import getLogger
+from alpha_beta import AlphaBeta, NEGATIVE_INFINITY, POSITIVE_INFINITY
+from .. import utilities
+
+VERSION = 1
+# Written by prob_cut_calibration_main.py and read by the app's AI player
+PROB_CUT_PARAMETERS_PATH = 'prob_cut_parameters.json'
+# Evaluator values are not integers, so the zero window needs an explicit width
+NULL_WINDOW = 1e-6
+DEFAULT_CUT_THRESHOLD = 1.5
+# (deep depth, shallow depth) pairs fitted by default
+DEFAULT_DEPTH_PAIRS = ((3, 1), (4, 2), (5, 3))
+# Inclusive empty square ranges that get their own regression
+DEFAULT_STAGE_BOUNDS = ((0, 64),)
+MIN_SAMPLES = 10
+
+
+def load_prob_cut_parameters(path):
+    with open(path) as parameter_file:
+        parameters = json.load(parameter_file)
+    if parameters.get('version') != VERSION:
+        raise ValueError('Unsupported ProbCut parameter version: ' + str(parameters.get('version')))
+    return parameters
+
+
+def write_prob_cut_parameters(path, parameters):
+    with open(path, 'w') as parameter_file:
+        json.dump(parameters, parameter_file, indent=2, sort_keys=True)
+
+
+# Multi-ProbCut on top of AlphaBeta. Before a node is searched to a depth
+# with calibrated pairs, shallow null window searches test whether the
+# regression deep = slope * shallow + intercept puts the deep value beyond
+# beta or alpha by more than cut_threshold standard deviations, in which
+# case the node is cut without the deep search. Pairs are tried from the
+# shallowest, and searches made for a test never cut themselves.
+class MultiProbCut(AlphaBeta):
+    def __init__(self, depth=6, parameters=None, cut_threshold=None, transposition_table=None,
+                 make_unmake=False, move_ordering=None):
+        super(MultiProbCut, self).__init__(depth=depth,
+                                           transposition_table=transposition_table,
+                                           make_unmake=make_unmake,
+                                           move_ordering=move_ordering)
+        self._logger = getLogger(__name__)
+        if parameters is None:
+            parameters = {'version': VERSION, 'pairs': []}
+        if cut_threshold is None:
+            cut_threshold = parameters.get('cut_threshold', DEFAULT_CUT_THRESHOLD)
+        self._cut_threshold = cut_threshold
+        self._pairs = {}
+        for pair in sorted(parameters['pairs'], key=lambda pair: pair['shallow_depth']):
+            if pair['slope'] > 0 and pair['shallow_depth'] < pair['deep_depth']:
+                self._pairs.setdefault(pair['deep_depth'], []).append(pair)
+        self._probing = False
+        self._cut_count = 0
+
+    def cut_threshold(self):
+        return self._cut_threshold
+
+    def cut_count(self):
+        # Nodes cut by the last search
+        return self._cut_count
+
+    def search_optimal_move(self, board_state, state_evaluator, player_color, opponent_color):
+        self._cut_count = 0
+        return super(MultiProbCut, self).search_optimal_move(board_state, state_evaluator,
+                                                             player_color, opponent_color)
+
+    def alpha_beta_search(self, board_state, state_evaluator,
+                          player_color, opponent_color,
+                          alpha, beta,
+                          depth, maximize):
+        pairs = self._pairs.get(depth)
+        if pairs is not None and not self._probing:
+            value = self.prob_cut(board_state, state_evaluator,
+                                  player_color, opponent_color,
+                                  alpha, beta,
+                                  depth, maximize, pairs)
+            if value is not None:
+                self._cut_count += 1
+                return value
+        return super(MultiProbCut, self).alpha_beta_search(board_state, state_evaluator,
+                                                           player_color, opponent_color,
+                                                           alpha, beta,
+                                                           depth, maximize)
+
+    def prob_cut(self, board_state, state_evaluator,
+                 player_color, opponent_color,
+                 alpha, beta,
+                 depth, maximize, pairs):
+        empties = board_state.empty_count()
+        # Search values are from player_color's point of view and the fit is
+        # from the side to move's, so the intercept flips at opponent nodes
+        sign = 1 if maximize else -1
+        self._probing = True
+        try:
+            for pair in pairs:
+                if not pair['min_empties'] <= empties <= pair['max_empties']:
+                    continue
+                slope = pair['slope']
+                intercept = sign * pair['intercept']
+                margin = self._cut_threshold * pair['sigma']
+                shallow_depth = pair['shallow_depth']
+                if beta < POSITIVE_INFINITY:
+                    bound = (beta + margin - intercept) / slope
+                    value = self.alpha_beta_search(board_state, state_evaluator,
+                                                   player_color, opponent_color,
+                                                   bound - NULL_WINDOW, bound,
+                                                   shallow_depth, maximize)
+                    if value >= bound:
+                        return beta
+                if alpha > NEGATIVE_INFINITY:
+                    bound = (alpha - margin - intercept) / slope
+                    value = self.alpha_beta_search(board_state, state_evaluator,
+                                                   player_color, opponent_color,
+                                                   bound, bound + NULL_WINDOW,
+                                                   shallow_depth, maximize)
+                    if value <= bound:
+                        return alpha
+        finally:
+            self._probing = False
+        return None
+
+
+# Collects shallow and deep search values of sample positions, seen from the
+# side to move, and fits deep = slope * shallow + intercept by least squares
+# for every depth pair and stage. sigma is the standard deviation of the
+# residuals.
+class ProbCutCalibrator(object):
+    def __init__(self, evaluator, depth_pairs=DEFAULT_DEPTH_PAIRS, stage_bounds=DEFAULT_STAGE_BOUNDS,
+                 make_unmake=True):
+        self._logger = getLogger(__name__)
+        self._evaluator = evaluator
+        self._depth_pairs = depth_pairs
+        self._stage_bounds = stage_bounds
+        self._searches = dict((depth, AlphaBeta(depth=depth, make_unmake=make_unmake))
+                              for depth in set(depth for pair in depth_pairs for depth in pair))
+        self._samples = dict(((deep_depth, shallow_depth, stage), ([], []))
+                             for (deep_depth, shallow_depth) in depth_pairs
+                             for stage in range(len(stage_bounds)))
+        self._position_count = 0
+
+    def position_count(self):
+        return self._position_count
+
+    def search_value(self, board_state, player_color, depth):
+        return self._searches[depth].alpha_beta_search(board_state, self._evaluator,
+                                                       player_color,
+                                                       utilities.opponent_color(player_color),
+                                                       NEGATIVE_INFINITY, POSITIVE_INFINITY,
+                                                       depth, True)
+
+    def add_position(self, board_state, player_color):
+        # Positions where the side to move has to pass are skipped
+        if not board_state.has_valid_move(player_color):
+            return False
+        empties = board_state.empty_count()
+        stages = [stage for (stage, (min_empties, max_empties)) in enumerate(self._stage_bounds)
+                  if min_empties <= empties <= max_empties]
+        if not stages:
+            return False
+        values = dict((depth, self.search_value(board_state, player_color, depth))
+                      for depth in self._searches)
+        for (deep_depth, shallow_depth) in self._depth_pairs:
+            for stage in stages:
+                (shallow_values, deep_values) = self._samples[(deep_depth, shallow_depth, stage)]
+                shallow_values.append(values[shallow_depth])
+                deep_values.append(values[deep_depth])
+        self._position_count += 1
+        return True
+
+    def fit(self, cut_threshold=DEFAULT_CUT_THRESHOLD):
+        pairs = []
+        for ((deep_depth, shallow_depth, stage), (shallow_values, deep_values)) in \
+                sorted(self._samples.items()):
+            if len(shallow_values) < MIN_SAMPLES:
+                self._logger.info('skipping depth pair %s: %d samples', str((deep_depth, shallow_depth)),
+                                  len(shallow_values))
+                continue
+            shallow_values = np.array(shallow_values, dtype=np.float64)
+            deep_values = np.array(deep_values, dtype=np.float64)
+            (slope, intercept) = np.polyfit(shallow_values, deep_values, 1)
+            residuals = deep_values - (slope * shallow_values + intercept)
+            (min_empties, max_empties) = self._stage_bounds[stage]
+            pairs.append({'deep_depth': deep_depth,
+                          'shallow_depth': shallow_depth,
+                          'min_empties': min_empties,
+                          'max_empties': max_empties,
+                          'slope': float(slope),
+                          'intercept': float(intercept),
+                          'sigma': float(np.std(residuals)),
+                          'correlation': float(np.corrcoef(shallow_values, deep_values)[0, 1]),
+                          'samples': len(shallow_values)})
+        return {'version': VERSION, 'cut_threshold': cut_threshold, 'pairs': pairs}
+
+    def write(self, path, cut_threshold=DEFAULT_CUT_THRESHOLD):
+        parameters = self.fit(cut_threshold)
+        write_prob_cut_parameters(path, parameters)
+        return parameters
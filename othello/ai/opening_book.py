@@ -0,0 +1,216 @@
+import os
+import numpy as np
+from logging import getLogger
+from endgame_solver import square_bit, bit_move
+from ..bit_board import BitBoard, FULL_MASK, SYMMETRY_NUM, popcount, transform, \
+    inverse_transform, canonical_bit_boards
+from .. import utilities
+
+MAGIC = b'OTHB'
+VERSION = 1
+NO_MOVE = 255
+
+HEADER_DTYPE = np.dtype([('magic', 'S4'),
+                         ('version', '<u2'),
+                         ('reserved', '<u2'),
+                         ('capacity', '<u4'),
+                         ('entry_num', '<u4')])
+
+# Open addressing slots keyed by the canonical (player, opponent) bit boards
+# of the side to move. move is row * 8 + column in the canonical orientation
+# and NO_MOVE marks an empty slot.
+SLOT_DTYPE = np.dtype([('player', '<u8'),
+                       ('opponent', '<u8'),
+                       ('move', '<u1'),
+                       ('reserved', '<u1'),
+                       ('count', '<u2'),
+                       ('value', '<f4')])
+
+
+def hash_slot(player_board, opponent_board, capacity):
+    mixed = (player_board * 0x9e3779b97f4a7c15 + opponent_board * 0xc2b2ae3d27d4eb4f) & FULL_MASK
+    mixed ^= mixed >> 29
+    return mixed & (capacity - 1)
+
+
+def encode_move(move):
+    (row, column) = move
+    return row * 8 + column
+
+
+def decode_move(square):
+    return (int(square) // 8, int(square) % 8)
+
+
+def canonical_position(player_board, opponent_board, move):
+    # Symmetric positions have several canonical symmetries; the smallest
+    # resulting move keeps equivalent moves on one book entry
+    (canonical_player, canonical_opponent, _) = canonical_bit_boards(player_board, opponent_board)
+    canonical_move = min(encode_move(bit_move(transform(square_bit(move), symmetry)))
+                         for symmetry in range(SYMMETRY_NUM)
+                         if transform(player_board, symmetry) == canonical_player and
+                         transform(opponent_board, symmetry) == canonical_opponent)
+    return (canonical_player, canonical_opponent, canonical_move)
+
+
+def players_and_opponents_board(board_state, player_color):
+    (black, white) = board_state.as_bit_boards()
+    if player_color == 'black':
+        return (black, white)
+    return (white, black)
+
+
+def write_opening_book(path, entries):
+    # entries are (player, opponent, move, count, value) in canonical form
+    capacity = 1
+    while capacity < 2 * len(entries):
+        capacity <<= 1
+    slots = np.zeros(capacity, dtype=SLOT_DTYPE)
+    slots['move'] = NO_MOVE
+    for (player_board, opponent_board, move, count, value) in entries:
+        slot = hash_slot(player_board, opponent_board, capacity)
+        while slots['move'][slot] != NO_MOVE:
+            slot = (slot + 1) & (capacity - 1)
+        slots[slot] = (player_board, opponent_board, move, 0, min(count, 0xffff), value)
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['capacity'] = capacity
+    header['entry_num'] = len(entries)
+    with open(path, 'wb') as book_file:
+        book_file.write(header.tobytes())
+        book_file.write(slots.tobytes())
+
+
+# Read-only book mapped from disk. A lookup hashes the canonical position
+# and probes a few slots, without searching or loading the file.
+class OpeningBook(object):
+    def __init__(self, path):
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) != 1 or header['magic'][0] != MAGIC:
+            raise ValueError('Not an opening book file: ' + path)
+        if header['version'][0] != VERSION:
+            raise ValueError('Unsupported opening book version: ' + str(header['version'][0]))
+        self._capacity = int(header['capacity'][0])
+        self._entry_num = int(header['entry_num'][0])
+        slots = np.memmap(path, dtype=SLOT_DTYPE, mode='r',
+                          offset=HEADER_DTYPE.itemsize, shape=(self._capacity,))
+        self._players = slots['player']
+        self._opponents = slots['opponent']
+        self._moves = slots['move']
+        self._slots = slots
+
+    def __len__(self):
+        return self._entry_num
+
+    def find_slot(self, player_board, opponent_board):
+        slot = hash_slot(player_board, opponent_board, self._capacity)
+        while self._moves[slot] != NO_MOVE:
+            # int() keeps numpy from comparing uint64 with a long through float64
+            if int(self._players[slot]) == player_board and \
+                    int(self._opponents[slot]) == opponent_board:
+                return slot
+            slot = (slot + 1) & (self._capacity - 1)
+        return None
+
+    def lookup(self, board_state, player_color):
+        (player_board, opponent_board) = players_and_opponents_board(board_state, player_color)
+        (canonical_player, canonical_opponent, symmetry) = \
+            canonical_bit_boards(player_board, opponent_board)
+        slot = self.find_slot(canonical_player, canonical_opponent)
+        if slot is None:
+            return None
+        canonical_move = decode_move(self._moves[slot])
+        return bit_move(inverse_transform(square_bit(canonical_move), symmetry))
+
+    def entry(self, board_state, player_color):
+        (player_board, opponent_board) = players_and_opponents_board(board_state, player_color)
+        (canonical_player, canonical_opponent, _) = canonical_bit_boards(player_board, opponent_board)
+        slot = self.find_slot(canonical_player, canonical_opponent)
+        if slot is None:
+            return None
+        return (int(self._slots['count'][slot]), float(self._slots['value'][slot]))
+
+
+# Collects move statistics for opening positions from finished games or
+# search results and writes the best move of each position as a book.
+class OpeningBookBuilder(object):
+    def __init__(self, max_plies=12, min_count=1):
+        self._max_plies = max_plies
+        self._min_count = min_count
+        self._positions = {}
+        self._logger = getLogger(__name__)
+
+    def add_move(self, board_state, player_color, move, value):
+        (player_board, opponent_board) = players_and_opponents_board(board_state, player_color)
+        (canonical_player, canonical_opponent, canonical_move) = \
+            canonical_position(player_board, opponent_board, move)
+        moves = self._positions.setdefault((canonical_player, canonical_opponent), {})
+        statistics = moves.setdefault(canonical_move, [0, 0.0])
+        statistics[0] += 1
+        statistics[1] += value
+
+    def add_game(self, moves):
+        # moves is a finished game as (player_color, (row, column)) pairs;
+        # each book move is valued by the final disc difference for its player
+        board_state = BitBoard()
+        for (player_color, move) in moves:
+            board_state.apply_new_move(tuple(move), player_color)
+        (black, white) = board_state.as_bit_boards()
+        black_difference = popcount(black) - popcount(white)
+        board_state = BitBoard()
+        for (player_color, move) in moves[:self._max_plies]:
+            value = black_difference if player_color == 'black' else -black_difference
+            self.add_move(board_state, player_color, tuple(move), value)
+            board_state.apply_new_move(tuple(move), player_color)
+
+    def add_game_records(self, reader):
+        for game_index in range(len(reader)):
+            self.add_game(reader.moves(game_index))
+
+    def add_search_results(self, search_algorithm, evaluator):
+        # Searches every distinct position reachable within max_plies
+        frontier = [(BitBoard(), 'black')]
+        visited = set()
+        for _ in range(self._max_plies):
+            next_frontier = []
+            for (board_state, player_color) in frontier:
+                opponent_color = utilities.opponent_color(player_color)
+                if not board_state.has_valid_move(player_color):
+                    if board_state.has_valid_move(opponent_color):
+                        next_frontier.append((board_state, opponent_color))
+                    continue
+                (player_board, opponent_board) = players_and_opponents_board(board_state, player_color)
+                key = canonical_bit_boards(player_board, opponent_board)[:2]
+                if key in visited:
+                    continue
+                visited.add(key)
+                move = search_algorithm.search_optimal_move(board_state, evaluator,
+                                                            player_color, opponent_color)
+                value = evaluator.evaluate(board_state.next_board_state(move, player_color),
+                                           player_color, opponent_color)
+                self.add_move(board_state, player_color, move, value)
+                for next_move in board_state.list_all_valid_moves(player_color):
+                    next_frontier.append((board_state.next_board_state(next_move, player_color),
+                                          opponent_color))
+            frontier = next_frontier
+            self._logger.info('Opening book: %d positions searched', len(visited))
+
+    def entries(self):
+        entries = []
+        for ((player_board, opponent_board), moves) in self._positions.items():
+            candidates = [(statistics[1] / statistics[0], statistics[0], move)
+                          for (move, statistics) in moves.items()
+                          if statistics[0] >= self._min_count]
+            if not candidates:
+                continue
+            (value, count, move) = max(candidates)
+            entries.append((player_board, opponent_board, move, count, value))
+        return entries
+
+    def write(self, path):
+        entries = self.entries()
+        write_opening_book(path, entries)
+        self._logger.info('Wrote %d book positions to %s (%d bytes)', len(entries), path,
+                          os.path.getsize(path))
+        return len(entries)
@@ -0,0 +1,163 @@
+import multiprocessing
+from logging import getLogger
+from search_algorithm import SearchAlgorithm, SearchCancelled
+from alpha_beta import AlphaBeta, NEGATIVE_INFINITY, POSITIVE_INFINITY
+from move_ordering import MoveOrdering
+from transposition_table import TranspositionTable
+from search_statistics import SearchStatistics
+from ..bit_board import BitBoard
+
+# Workers search with the shared alpha lowered by this margin, so that any
+# result above their bound is exact and ties keep the sequential move choice.
+ALPHA_MARGIN = 1e-6
+
+worker_state = {}
+
+
+# Stop flag shared with the workers. Unlike a multiprocessing.Event, reading
+# it takes no lock, so searches can check it at every node.
+class SharedStopFlag(object):
+    def __init__(self):
+        self._flag = multiprocessing.RawValue('b', 0)
+
+    def set(self):
+        self._flag.value = 1
+
+    def clear(self):
+        self._flag.value = 0
+
+    def is_set(self):
+        return self._flag.value != 0
+
+
+def initialize_worker(depth, evaluator, shared_alpha, stop_event, transposition_table_size,
+                      use_move_ordering):
+    transposition_table = None
+    if transposition_table_size is not None:
+        transposition_table = TranspositionTable(size=transposition_table_size)
+    move_ordering = MoveOrdering() if use_move_ordering else None
+    worker_state['search_algorithm'] = AlphaBeta(depth=depth,
+                                                 transposition_table=transposition_table,
+                                                 make_unmake=True,
+                                                 move_ordering=move_ordering)
+    worker_state['search_algorithm'].set_stop_event(stop_event)
+    worker_state['evaluator'] = evaluator
+    worker_state['shared_alpha'] = shared_alpha
+    worker_state['depth'] = depth
+
+
+def search_root_move(task):
+    (index, move, black, white, rows, columns, player_color, opponent_color, collect_statistics) = task
+    board_state = BitBoard(rows, columns, black, white)
+    alpha = worker_state['shared_alpha'].value - ALPHA_MARGIN
+    search_algorithm = worker_state['search_algorithm']
+    statistics = SearchStatistics() if collect_statistics else None
+    search_algorithm.attach_statistics(statistics)
+    value = search_algorithm.search_child(board_state, move, player_color,
+                                          worker_state['evaluator'],
+                                          player_color, opponent_color,
+                                          alpha, POSITIVE_INFINITY,
+                                          worker_state['depth'], False)
+    search_algorithm.attach_statistics(None)
+    return (index, value, alpha, statistics)
+
+
+class ParallelAlphaBeta(SearchAlgorithm):
+    def __init__(self, depth=4, processes=None, transposition_table_size=None, use_move_ordering=True):
+        super(ParallelAlphaBeta, self).__init__()
+        self._logger = getLogger(__name__)
+        self._depth = depth
+        self._processes = processes
+        self._transposition_table_size = transposition_table_size
+        self._use_move_ordering = use_move_ordering
+        self._pool = None
+        self._pool_evaluator = None
+        self._shared_alpha = None
+        self._worker_stop_event = None
+
+    def search_optimal_move(self, board_state, state_evaluator, player_color, opponent_color):
+        valid_moves = board_state.list_all_valid_moves(player_color)
+        if len(valid_moves) == 1:
+            return valid_moves[0]
+        pool = self.worker_pool(state_evaluator)
+        (black, white) = board_state.as_bit_boards()
+        (rows, columns) = board_state.shape
+        statistics = self._statistics
+        tasks = [(index, move, black, white, rows, columns, player_color, opponent_color,
+                  statistics is not None)
+                 for (index, move) in enumerate(valid_moves)]
+        self._shared_alpha.value = NEGATIVE_INFINITY
+        best_index = 0
+        best_value = NEGATIVE_INFINITY
+        results = pool.imap_unordered(search_root_move, tasks)
+        try:
+            for result in results:
+                (best_index, best_value) = self.apply_root_result(result, valid_moves,
+                                                                  best_index, best_value)
+        except SearchCancelled:
+            # Wait for the remaining tasks so none of them outlives this search
+            self.drain_results(results)
+            raise
+        if statistics is not None:
+            statistics.complete_depth(self._depth)
+        return valid_moves[best_index]
+
+    def apply_root_result(self, result, valid_moves, best_index, best_value):
+        (index, value, alpha, worker_statistics) = result
+        statistics = self._statistics
+        self._logger.debug('searched for move: ' + str(valid_moves[index]) + ' value: ' + str(value))
+        if statistics is not None:
+            statistics.add_counters(worker_statistics)
+        if value <= alpha:
+            # Only an upper bound below the best value seen so far
+            return (best_index, best_value)
+        if best_value < value or (best_value == value and index < best_index):
+            best_value = value
+            best_index = index
+        if self._shared_alpha.value < best_value:
+            self._shared_alpha.value = best_value
+        return (best_index, best_value)
+
+    def drain_results(self, results):
+        while True:
+            try:
+                next(results)
+            except StopIteration:
+                return
+            except SearchCancelled:
+                pass
+
+    def stop(self):
+        super(ParallelAlphaBeta, self).stop()
+        if self._worker_stop_event is not None:
+            self._worker_stop_event.set()
+
+    def clear_stop(self):
+        super(ParallelAlphaBeta, self).clear_stop()
+        if self._worker_stop_event is not None:
+            self._worker_stop_event.clear()
+
+    def worker_pool(self, state_evaluator):
+        # Workers live across moves; they are only restarted for a new evaluator
+        if self._pool is not None and self._pool_evaluator is state_evaluator:
+            return self._pool
+        self.close()
+        self._shared_alpha = multiprocessing.Value('d', NEGATIVE_INFINITY)
+        self._worker_stop_event = SharedStopFlag()
+        if self.stop_requested():
+            self._worker_stop_event.set()
+        self._pool = multiprocessing.Pool(self._processes,
+                                          initializer=initialize_worker,
+                                          initargs=(self._depth, state_evaluator, self._shared_alpha,
+                                                    self._worker_stop_event,
+                                                    self._transposition_table_size,
+                                                    self._use_move_ordering))
+        self._pool_evaluator = state_evaluator
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+        self._pool = None
+        self._pool_evaluator = None
@@ -0,0 +1,158 @@
+from logging import getLogger
+from search_algorithm import SearchAlgorithm, SearchCancelled
+
+
+NEGATIVE_INFINITY = float('-infinity')
+POSITIVE_INFINITY = float('infinity')
+# Evaluator values are not integers, so the zero window needs an explicit width
+NULL_WINDOW = 1e-6
+
+
+# Negamax formulation: values are always seen from the side to move, which
+# relies on evaluate(board, a, b) == -evaluate(board, b, a).
+class PrincipalVariationSearch(SearchAlgorithm):
+    def __init__(self, depth=4, aspiration_window=None, move_ordering=None, make_unmake=False):
+        super(PrincipalVariationSearch, self).__init__()
+        self._logger = getLogger(__name__)
+        self._depth = depth
+        self._aspiration_window = aspiration_window
+        self._move_ordering = move_ordering
+        self._make_unmake = make_unmake
+        self._previous_value = None
+        self._principal_variation = []
+        self._pv_table = []
+
+    def principal_variation(self):
+        return self._principal_variation
+
+    def search_optimal_move(self, board_state, state_evaluator, player_color, opponent_color):
+        (best_move, _, _) = self.search_principal_variation(board_state, state_evaluator,
+                                                            player_color, opponent_color)
+        return best_move
+
+    def search_principal_variation(self, board_state, state_evaluator, player_color, opponent_color):
+        if self._move_ordering is not None:
+            self._move_ordering.new_search()
+        valid_moves = board_state.list_all_valid_moves(player_color)
+        guess = self._previous_value
+        result = None
+        if self._aspiration_window is not None and guess is not None:
+            alpha = guess - self._aspiration_window
+            beta = guess + self._aspiration_window
+            result = self.search_root(board_state, state_evaluator,
+                                      player_color, opponent_color,
+                                      valid_moves, alpha, beta)
+            value = result[1]
+            if value <= alpha or beta <= value:
+                self._logger.debug('aspiration window failed: ' + str(value) +
+                                   ' not in ' + str((alpha, beta)))
+                result = None
+        if result is None:
+            result = self.search_root(board_state, state_evaluator,
+                                      player_color, opponent_color,
+                                      valid_moves, NEGATIVE_INFINITY, POSITIVE_INFINITY)
+        (best_move, best_value, principal_variation) = result
+        if self._statistics is not None:
+            self._statistics.complete_depth(self._depth)
+        self._previous_value = best_value
+        self._principal_variation = principal_variation
+        return result
+
+    def search_root(self, board_state, state_evaluator,
+                    player_color, opponent_color,
+                    valid_moves, alpha, beta):
+        self._pv_table = [[] for _ in range(self._depth + 2)]
+        best_move = valid_moves[0]
+        best_value = NEGATIVE_INFINITY
+        principal_variation = [best_move]
+        for (index, move) in enumerate(valid_moves):
+            value = self.search_move(board_state, move, index, state_evaluator,
+                                     player_color, opponent_color,
+                                     alpha, beta, self._depth, 1)
+            self._logger.debug('searched for move: ' + str(move) + ' value: ' + str(value))
+            if best_value < value:
+                best_value = value
+                best_move = move
+                principal_variation = [move] + self._pv_table[1]
+            alpha = max(alpha, best_value)
+            if beta <= alpha:
+                break
+        return (best_move, best_value, principal_variation)
+
+    def search_move(self, board_state, move, index, state_evaluator,
+                    player_color, opponent_color,
+                    alpha, beta, depth, ply):
+        if index == 0:
+            return -self.search_child(board_state, move, state_evaluator,
+                                      player_color, opponent_color,
+                                      -beta, -alpha, depth, ply)
+        # Prove the move is no better than alpha with a zero window first
+        value = -self.search_child(board_state, move, state_evaluator,
+                                   player_color, opponent_color,
+                                   -alpha - NULL_WINDOW, -alpha, depth, ply)
+        if alpha < value < beta:
+            value = -self.search_child(board_state, move, state_evaluator,
+                                       player_color, opponent_color,
+                                       -beta, -alpha, depth, ply)
+        return value
+
+    def search_child(self, board_state, move, state_evaluator,
+                     player_color, opponent_color,
+                     alpha, beta, depth, ply):
+        if not self._make_unmake:
+            next_state = board_state.next_board_state(move, player_color)
+            return self.negamax_search(next_state, state_evaluator,
+                                       opponent_color, player_color,
+                                       alpha, beta, depth, ply)
+        undo_info = board_state.make_move(move, player_color)
+        try:
+            return self.negamax_search(board_state, state_evaluator,
+                                       opponent_color, player_color,
+                                       alpha, beta, depth, ply)
+        finally:
+            board_state.undo_move(move, undo_info, player_color)
+
+    def negamax_search(self, board_state, state_evaluator,
+                       player_color, opponent_color,
+                       alpha, beta, depth, ply):
+        if self._stop_event.is_set():
+            raise SearchCancelled()
+        pv_table = self._pv_table
+        pv_table[ply] = []
+        statistics = self._statistics
+        if statistics is not None:
+            statistics.nodes += 1
+        if depth == 0 or board_state.is_end_state():
+            if statistics is not None:
+                statistics.leaf_evaluations += 1
+            return state_evaluator.evaluate(board_state, player_color, opponent_color)
+
+        if not board_state.has_valid_move(player_color):
+            value = -self.negamax_search(board_state, state_evaluator,
+                                         opponent_color, player_color,
+                                         -beta, -alpha, depth - 1, ply + 1)
+            pv_table[ply] = [None] + pv_table[ply + 1]
+            return value
+
+        moves = board_state.list_all_valid_moves(player_color)
+        ordering = self._move_ordering
+        if ordering is not None:
+            moves = ordering.order_moves(moves, player_color, ply)
+
+        best_value = NEGATIVE_INFINITY
+        for (index, move) in enumerate(moves):
+            value = self.search_move(board_state, move, index, state_evaluator,
+                                     player_color, opponent_color,
+                                     alpha, beta, depth - 1, ply + 1)
+            if best_value < value:
+                best_value = value
+                if alpha < value:
+                    alpha = value
+                    pv_table[ply] = [move] + pv_table[ply + 1]
+            if beta <= alpha:
+                if statistics is not None:
+                    statistics.beta_cutoffs += 1
+                if ordering is not None:
+                    ordering.record_cutoff(move, player_color, ply, depth, index)
+                break
+        return best_value
@@ -1,6 +1,53 @@
+import threading
+from search_statistics import SearchStatistics
+
+
+class SearchCancelled(Exception):
+    pass
+
+
 class SearchAlgorithm(object):
     def __init__(self):
-        pass
+        self._statistics = None
+        self._statistics_listener = None
+        self._stop_event = threading.Event()
 
     def search_optimal_move(self, board_state, state_evaluator, player_color, opponent_color):
-        pass
\ No newline at end of file
+        pass
+
+    def search_with_statistics(self, board_state, state_evaluator, player_color, opponent_color):
+        statistics = SearchStatistics(type(self).__name__)
+        self.attach_statistics(statistics)
+        statistics.start()
+        try:
+            move = self.search_optimal_move(board_state, state_evaluator, player_color, opponent_color)
+        finally:
+            statistics.stop()
+            self.attach_statistics(None)
+        if self._statistics_listener is not None:
+            self._statistics_listener(statistics)
+        return (move, statistics)
+
+    def stop(self):
+        # Running and later searches raise SearchCancelled at their next node
+        # until clear_stop is called; safe to call from another thread
+        self._stop_event.set()
+
+    def clear_stop(self):
+        self._stop_event.clear()
+
+    def stop_requested(self):
+        return self._stop_event.is_set()
+
+    def set_stop_event(self, stop_event):
+        # Any object with is_set(), e.g. a multiprocessing.Event shared with workers
+        self._stop_event = stop_event
+
+    def attach_statistics(self, statistics):
+        self._statistics = statistics
+
+    def set_statistics_listener(self, listener):
+        self._statistics_listener = listener
+
+    def statistics_listener(self):
+        return self._statistics_listener
@@ -0,0 +1,65 @@
+import time
+
+
+# Counters filled in by a search while it runs under search_with_statistics.
+# Searches only touch it behind an "is not None" check, so an uninstrumented
+# search pays one attribute test per node.
+class SearchStatistics(object):
+    def __init__(self, algorithm_name=None):
+        self.algorithm_name = algorithm_name
+        self.nodes = 0
+        self.leaf_evaluations = 0
+        self.beta_cutoffs = 0
+        self.table_hits = 0
+        self.depth = None
+        self.seconds = 0.0
+        self.depth_timings = []
+        self._start_time = None
+
+    def start(self):
+        self._start_time = time.time()
+
+    def stop(self):
+        self.seconds = time.time() - self._start_time
+
+    def add_counters(self, other):
+        self.nodes += other.nodes
+        self.leaf_evaluations += other.leaf_evaluations
+        self.beta_cutoffs += other.beta_cutoffs
+        self.table_hits += other.table_hits
+
+    def complete_depth(self, depth):
+        # Called when an iteration (or the only iteration) of the search ends
+        elapsed = time.time() - self._start_time
+        self.depth = depth
+        self.depth_timings.append({'depth': depth, 'seconds': elapsed, 'nodes': self.nodes})
+
+    def nodes_per_second(self):
+        if self.seconds <= 0:
+            return None
+        return self.nodes / self.seconds
+
+    def branching_factor(self):
+        # Node growth between the last two iterations, or the root of the
+        # node count over the depth for a single fixed depth search
+        timings = [timing for timing in self.depth_timings if timing['depth'] > 0]
+        if len(timings) >= 2:
+            previous_nodes = timings[-2]['nodes'] - (timings[-3]['nodes'] if len(timings) >= 3 else 0)
+            last_nodes = timings[-1]['nodes'] - timings[-2]['nodes']
+            if previous_nodes > 0:
+                return float(last_nodes) / previous_nodes
+        if self.depth and self.nodes > 0:
+            return self.nodes ** (1.0 / self.depth)
+        return None
+
+    def as_dict(self):
+        return {'algorithm': self.algorithm_name,
+                'nodes': self.nodes,
+                'leaf_evaluations': self.leaf_evaluations,
+                'beta_cutoffs': self.beta_cutoffs,
+                'table_hits': self.table_hits,
+                'depth': self.depth,
+                'seconds': self.seconds,
+                'nodes_per_second': self.nodes_per_second(),
+                'branching_factor': self.branching_factor(),
+                'depth_timings': self.depth_timings}
@@ -0,0 +1,122 @@
+import random
+from ..bit_board import MAX_BOARD_SIZE
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+REPLACE_ALWAYS = 'always'
+REPLACE_DEPTH_PREFERRED = 'depth_preferred'
+
+# Rough size of one stored entry (tuple, key, value and move objects)
+ENTRY_SIZE_BYTES = 200
+
+
+class ZobristHash(object):
+    def __init__(self, seed=0):
+        generator = random.Random(seed)
+        # One table per byte of each bit board, enough for the largest board
+        byte_num = MAX_BOARD_SIZE * MAX_BOARD_SIZE // 8
+        self._black_keys = [[generator.getrandbits(64) for _ in range(256)]
+                            for _ in range(byte_num)]
+        self._white_keys = [[generator.getrandbits(64) for _ in range(256)]
+                            for _ in range(byte_num)]
+        self._side_keys = {'black': generator.getrandbits(64),
+                           'white': generator.getrandbits(64)}
+
+    def hash(self, black_bit_board, white_bit_board, player_color):
+        key = self._side_keys[player_color]
+        black_keys = self._black_keys
+        white_keys = self._white_keys
+        # Bytes are hashed up to the highest stone, so an 8x8 position takes
+        # at most 16 lookups and larger boards hash all of their squares
+        i = 0
+        while black_bit_board | white_bit_board:
+            key ^= black_keys[i][black_bit_board & 0xff] ^ \
+                white_keys[i][white_bit_board & 0xff]
+            black_bit_board >>= 8
+            white_bit_board >>= 8
+            i += 1
+        return key
+
+
+# Values are stored from the searching player's point of view, so a table
+# must not be shared between the two players of a game.
+class TranspositionTable(object):
+    def __init__(self, size=1 << 16, replacement_policy=REPLACE_DEPTH_PREFERRED,
+                 max_megabytes=None, zobrist_hash=None):
+        if max_megabytes is not None:
+            size = min(size, max_megabytes * 1024 * 1024 // ENTRY_SIZE_BYTES)
+        assert size > 0
+        assert replacement_policy in (REPLACE_ALWAYS, REPLACE_DEPTH_PREFERRED)
+        self._size = size
+        self._replacement_policy = replacement_policy
+        self._zobrist_hash = zobrist_hash if zobrist_hash is not None else ZobristHash()
+        self._entries = [None] * size
+        self.reset_counters()
+
+    def hash_key(self, board_state, player_color):
+        (black, white) = board_state.as_bit_boards()
+        return self._zobrist_hash.hash(black, white, player_color)
+
+    def lookup(self, key):
+        entry = self._entries[key % self._size]
+        if entry is not None and entry[0] == key:
+            self._hits += 1
+            return entry
+        self._misses += 1
+        return None
+
+    def store(self, key, depth, value, bound, best_move):
+        index = key % self._size
+        current = self._entries[index]
+        if current is None:
+            self._used += 1
+        elif current[0] != key:
+            if self._replacement_policy == REPLACE_DEPTH_PREFERRED and current[1] > depth:
+                self._rejected += 1
+                return
+            self._replaced += 1
+        self._entries[index] = (key, depth, value, bound, best_move)
+        self._stores += 1
+
+    def best_move(self, key):
+        entry = self._entries[key % self._size]
+        if entry is not None and entry[0] == key:
+            return entry[4]
+        return None
+
+    def clear(self):
+        self._entries = [None] * self._size
+        self._used = 0
+
+    def reset_counters(self):
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._replaced = 0
+        self._rejected = 0
+        self._used = sum(1 for entry in self._entries if entry is not None)
+
+    def size(self):
+        return self._size
+
+    def hits(self):
+        return self._hits
+
+    def misses(self):
+        return self._misses
+
+    def hit_rate(self):
+        probes = self._hits + self._misses
+        return float(self._hits) / probes if probes != 0 else 0.0
+
+    def statistics(self):
+        return {'size': self._size,
+                'used': self._used,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self.hit_rate(),
+                'stores': self._stores,
+                'replaced': self._replaced,
+                'rejected': self._rejected}
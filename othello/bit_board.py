@@ -1,11 +1,234 @@
 from board import Board
 from logging import getLogger, DEBUG, basicConfig
 import numpy as np
+import struct
 import utilities
 
 UP_DOWN_MASK = 0x00ffffffffffff00
 LEFT_RIGHT_MASK = 0x7e7e7e7e7e7e7e7e
 DIAGONAL_MASK = UP_DOWN_MASK & LEFT_RIGHT_MASK
+FULL_MASK = 0xffffffffffffffff
+
+# (shift, mask) pairs for the eight directions. Positive shift is a left shift.
+DIRECTIONS = ((8, UP_DOWN_MASK), (-8, UP_DOWN_MASK),
+              (1, LEFT_RIGHT_MASK), (-1, LEFT_RIGHT_MASK),
+              (9, DIAGONAL_MASK), (7, DIAGONAL_MASK),
+              (-7, DIAGONAL_MASK), (-9, DIAGONAL_MASK))
+
+# Dihedral symmetries are numbered 0-7: bit 2 transposes, bit 1 mirrors the
+# rows and bit 0 mirrors the columns, applied in that order.
+SYMMETRY_NUM = 8
+MIRROR_MASKS = ((1, 0x5555555555555555),
+                (2, 0x3333333333333333),
+                (4, 0x0f0f0f0f0f0f0f0f))
+TRANSPOSE_MASKS = ((28, 0x0f0f0f0f00000000),
+                   (14, 0x3333000033330000),
+                   (7, 0x5500550055005500))
+
+
+MIN_BOARD_SIZE = 4
+MAX_BOARD_SIZE = 16
+COLUMN_LABELS = 'ABCDEFGHIJKLMNOP'
+
+
+def mobility_mask(player_board, opponent_board, directions=DIRECTIONS, full_mask=FULL_MASK,
+                  flood_steps=5):
+    # The defaults are the 8x8 board; BoardGeometry passes its own
+    empty = ~(player_board | opponent_board) & full_mask
+    moves = 0
+    for (shift, mask) in directions:
+        masked_opponent_board = opponent_board & mask
+        if shift > 0:
+            flood = masked_opponent_board & (player_board << shift)
+            for _ in range(flood_steps):
+                flood |= masked_opponent_board & (flood << shift)
+            moves |= flood << shift
+        else:
+            shift = -shift
+            flood = masked_opponent_board & (player_board >> shift)
+            for _ in range(flood_steps):
+                flood |= masked_opponent_board & (flood >> shift)
+            moves |= flood >> shift
+    return moves & empty
+
+
+def flip_pattern(player_board, opponent_board, move_bit, directions=DIRECTIONS):
+    flips = 0
+    for (shift, mask) in directions:
+        masked_opponent_board = opponent_board & mask
+        line = 0
+        if shift > 0:
+            cursor = move_bit << shift
+            while cursor & masked_opponent_board:
+                line |= cursor
+                cursor <<= shift
+        else:
+            cursor = move_bit >> -shift
+            while cursor & masked_opponent_board:
+                line |= cursor
+                cursor >>= -shift
+        if cursor & player_board:
+            flips |= line
+    return flips
+
+
+def popcount(bit_board):
+    return bin(bit_board).count('1')
+
+
+def mirror_rows(bit_board):
+    # Row r moves to row 7 - r, which reverses the bytes
+    return struct.unpack('<Q', struct.pack('>Q', bit_board))[0]
+
+
+def mirror_columns(bit_board):
+    for (shift, mask) in MIRROR_MASKS:
+        bit_board = ((bit_board >> shift) & mask) | ((bit_board & mask) << shift)
+    return bit_board
+
+
+def transpose(bit_board):
+    for (shift, mask) in TRANSPOSE_MASKS:
+        swapped = mask & (bit_board ^ (bit_board << shift))
+        bit_board = bit_board ^ swapped ^ (swapped >> shift)
+    return bit_board
+
+
+def transform(bit_board, symmetry):
+    if symmetry & 4:
+        bit_board = transpose(bit_board)
+    if symmetry & 2:
+        bit_board = mirror_rows(bit_board)
+    if symmetry & 1:
+        bit_board = mirror_columns(bit_board)
+    return bit_board
+
+
+def inverse_transform(bit_board, symmetry):
+    if symmetry & 1:
+        bit_board = mirror_columns(bit_board)
+    if symmetry & 2:
+        bit_board = mirror_rows(bit_board)
+    if symmetry & 4:
+        bit_board = transpose(bit_board)
+    return bit_board
+
+
+def symmetric_bit_boards(bit_board):
+    # All eight transforms in symmetry order, sharing the intermediate steps
+    bit_boards = []
+    for base in (bit_board, transpose(bit_board)):
+        mirrored = mirror_rows(base)
+        bit_boards.extend((base, mirror_columns(base), mirrored, mirror_columns(mirrored)))
+    return bit_boards
+
+
+def canonical_bit_boards(player_board, opponent_board):
+    # The smallest (player, opponent) pair over all symmetries and the
+    # symmetry that produces it
+    players = symmetric_bit_boards(player_board)
+    opponents = symmetric_bit_boards(opponent_board)
+    return min((players[symmetry], opponents[symmetry], symmetry)
+               for symmetry in range(SYMMETRY_NUM))
+
+
+def move_bits(bit_board, moves):
+    # moves are (shift, mask) pairs: the bits in mask move by shift
+    result = 0
+    for (shift, mask) in moves:
+        if shift >= 0:
+            result |= (bit_board & mask) << shift
+        else:
+            result |= (bit_board & mask) >> -shift
+    return result
+
+
+# Masks and shifts of one board size, computed once and shared by all boards
+# of that size through board_geometry. Square (row, column) is bit
+# (rows - row - 1) * columns + (columns - column - 1) as on the 8x8 board;
+# boards over 64 squares are just longer Python ints.
+class BoardGeometry(object):
+    def __init__(self, rows, columns):
+        assert rows % 2 == 0 and columns % 2 == 0
+        assert MIN_BOARD_SIZE <= rows <= MAX_BOARD_SIZE and MIN_BOARD_SIZE <= columns <= MAX_BOARD_SIZE
+        self.rows = rows
+        self.columns = columns
+        self.square_num = rows * columns
+        self.full_mask = (1 << self.square_num) - 1
+        row_masks = [((1 << columns) - 1) << (row * columns) for row in range(rows)]
+        column_masks = [sum(1 << (row * columns + column) for row in range(rows))
+                        for column in range(columns)]
+        self.up_down_mask = self.full_mask & ~row_masks[0] & ~row_masks[-1]
+        self.left_right_mask = self.full_mask & ~column_masks[0] & ~column_masks[-1]
+        self.diagonal_mask = self.up_down_mask & self.left_right_mask
+        self.directions = ((columns, self.up_down_mask), (-columns, self.up_down_mask),
+                           (1, self.left_right_mask), (-1, self.left_right_mask),
+                           (columns + 1, self.diagonal_mask), (columns - 1, self.diagonal_mask),
+                           (-columns + 1, self.diagonal_mask), (-columns - 1, self.diagonal_mask))
+        # A line of opponent stones is at most the board length minus two
+        self.flood_steps = max(rows, columns) - 3
+        # Transposing only maps a square board onto itself
+        self.symmetry_num = SYMMETRY_NUM if rows == columns else SYMMETRY_NUM // 2
+        # row_masks and column_masks are indexed by bit position, which runs
+        # opposite to the row and column numbers
+        self.mirror_row_moves = [((rows - 1 - 2 * index) * columns, row_masks[index])
+                                 for index in range(rows)]
+        self.mirror_column_moves = [(columns - 1 - 2 * index, column_masks[index])
+                                    for index in range(columns)]
+        self.transpose_moves = []
+        if rows == columns:
+            for difference in range(1 - rows, rows):
+                mask = 0
+                for row in range(rows):
+                    column = row - difference
+                    if 0 <= column < columns:
+                        mask |= self.square_bit((row, column))
+                self.transpose_moves.append(((rows - 1) * difference, mask))
+
+    def square_bit(self, position):
+        (row, column) = position
+        assert 0 <= row < self.rows and 0 <= column < self.columns
+        return 1 << ((self.rows - row - 1) * self.columns + (self.columns - column - 1))
+
+    def position_of(self, bit):
+        index = bit.bit_length() - 1
+        return (self.rows - index // self.columns - 1,
+                self.columns - index % self.columns - 1)
+
+    def mobility_mask(self, player_board, opponent_board):
+        return mobility_mask(player_board, opponent_board, self.directions, self.full_mask,
+                             self.flood_steps)
+
+    def flip_pattern(self, player_board, opponent_board, move_bit):
+        return flip_pattern(player_board, opponent_board, move_bit, self.directions)
+
+    def transform(self, bit_board, symmetry):
+        # Same numbering as the module level transform
+        if symmetry & 4:
+            assert self.rows == self.columns
+            bit_board = move_bits(bit_board, self.transpose_moves)
+        if symmetry & 2:
+            bit_board = move_bits(bit_board, self.mirror_row_moves)
+        if symmetry & 1:
+            bit_board = move_bits(bit_board, self.mirror_column_moves)
+        return bit_board
+
+    def canonical_bit_boards(self, player_board, opponent_board):
+        if self.rows == 8 and self.columns == 8:
+            return canonical_bit_boards(player_board, opponent_board)
+        return min((self.transform(player_board, symmetry), self.transform(opponent_board, symmetry),
+                    symmetry) for symmetry in range(self.symmetry_num))
+
+
+BOARD_GEOMETRIES = {}
+
+
+def board_geometry(rows, columns):
+    geometry = BOARD_GEOMETRIES.get((rows, columns))
+    if geometry is None:
+        geometry = BoardGeometry(rows, columns)
+        BOARD_GEOMETRIES[(rows, columns)] = geometry
+    return geometry
 
 
 class BitBoard(Board):
@@ -14,6 +237,7 @@ class BitBoard(Board):
         self._logger = getLogger(__name__)
         self._rows = rows
         self._columns = columns
+        self._geometry = board_geometry(rows, columns)
 
         if black_bit_board is not None and white_bit_board is not None:
             self._black_bit_board = black_bit_board
@@ -24,8 +248,8 @@ class BitBoard(Board):
         self.shape = (rows, columns)
 
     def generate_initial_board(self, rows, columns):
-        x_center = rows / 2
-        y_center = columns / 2
+        x_center = rows // 2
+        y_center = columns // 2
         black = self.board_with_stone_at(
             (x_center, y_center - 1)) | self.board_with_stone_at((x_center - 1, y_center))
         white = self.board_with_stone_at(
@@ -41,6 +265,18 @@ class BitBoard(Board):
         flip_pattern = self.generate_flip_pattern(move, player_color)
         if flip_pattern == 0:
             return
+        self.toggle_move(move, flip_pattern, player_color)
+
+    def make_move(self, move, player_color):
+        flip_pattern = self.generate_flip_pattern(move, player_color)
+        self.toggle_move(move, flip_pattern, player_color)
+        return flip_pattern
+
+    def undo_move(self, move, flip_pattern, player_color):
+        self.toggle_move(move, flip_pattern, player_color)
+
+    def toggle_move(self, move, flip_pattern, player_color):
+        # Applying the same xor twice restores the board
         move_bit_board = self.board_with_stone_at(move)
         if player_color == 'black':
             self._black_bit_board ^= (move_bit_board | flip_pattern)
@@ -50,7 +286,7 @@ class BitBoard(Board):
             self._black_bit_board ^= flip_pattern
 
     def has_valid_move(self, player_color):
-        return len(self.list_all_valid_moves(player_color)) != 0
+        return self.legal_moves_mask(player_color) != 0
 
     def is_end_state(self):
         return not self.has_valid_move('black') and not self.has_valid_move('white')
@@ -59,28 +295,18 @@ class BitBoard(Board):
         position_bit_board = self.board_with_stone_at(position)
         return position_bit_board & (self._black_bit_board | self._white_bit_board) == 0
 
+    def legal_moves_mask(self, player_color):
+        (player_board, opponent_board) = self.select_players_and_opponents_board(
+            player_color)
+        return self._geometry.mobility_mask(player_board, opponent_board)
+
     def list_all_valid_moves(self, player_color):
-        moves = []
-        (rows, columns) = self.shape
-        for x in range(rows):
-            for y in range(columns):
-                move = (x, y)
-                if self.is_valid_move(move, player_color):
-                    moves.append(move)
-        return moves
+        return self.moves_in_mask(self.legal_moves_mask(player_color))
 
     def list_all_next_states(self, player_color):
         states = []
-        (rows, columns) = self.shape
-        for x in range(rows):
-            for y in range(columns):
-                move = (x, y)
-                if not self.is_empty_position(move):
-                    continue
-                next_state = self.next_board_state(move, player_color)
-                if self.is_same_board_state(next_state):
-                    continue
-                states.append(next_state)
+        for move in self.list_all_valid_moves(player_color):
+            states.append(self.next_board_state(move, player_color))
         return states
 
     def list_all_empty_positions(self):
@@ -94,75 +320,13 @@ class BitBoard(Board):
         return positions
 
     def generate_flip_pattern(self, move, player_color):
-        flip_pattern = 0
         if not self.is_empty_position(move):
             # Stone is already placed
-            return flip_pattern
-        move_bit_board = self.board_with_stone_at(move)
-        flip_pattern = self.flip_pattern_vertically_up(move_bit_board, player_color) | \
-            self.flip_pattern_vertically_down(move_bit_board, player_color) | \
-            self.flip_pattern_horizontally_left(move_bit_board, player_color) | \
-            self.flip_pattern_horizontally_right(move_bit_board, player_color) | \
-            self.flip_pattern_diagonally_up_left(move_bit_board, player_color) | \
-            self.flip_pattern_diagonally_up_right(move_bit_board, player_color) | \
-            self.flip_pattern_diagonally_down_left(move_bit_board, player_color) | \
-            self.flip_pattern_diagonally_down_right(
-                move_bit_board, player_color)
-        return flip_pattern
-
-    def flip_pattern_vertically_up(self, move_bit_board, player_color):
-        def shifter(bit_board):
-            return (bit_board << self._columns)
-        return self.flip_pattern_for_shifter_direction(move_bit_board, player_color, shifter, UP_DOWN_MASK)
-
-    def flip_pattern_vertically_down(self, move_bit_board, player_color):
-        def shifter(bit_board):
-            return (bit_board >> self._columns)
-        return self.flip_pattern_for_shifter_direction(move_bit_board, player_color, shifter, UP_DOWN_MASK)
-
-    def flip_pattern_horizontally_left(self, move_bit_board, player_color):
-        def shifter(bit_board):
-            return (bit_board << 1)
-        return self.flip_pattern_for_shifter_direction(move_bit_board, player_color, shifter, LEFT_RIGHT_MASK)
-
-    def flip_pattern_horizontally_right(self, move_bit_board, player_color):
-        def shifter(bit_board):
-            return (bit_board >> 1)
-        return self.flip_pattern_for_shifter_direction(move_bit_board, player_color, shifter, LEFT_RIGHT_MASK)
-
-    def flip_pattern_diagonally_up_left(self, move_bit_board, player_color):
-        def shifter(bit_board):
-            return (bit_board << (self._columns + 1))
-        return self.flip_pattern_for_shifter_direction(move_bit_board, player_color, shifter, DIAGONAL_MASK)
-
-    def flip_pattern_diagonally_up_right(self, move_bit_board, player_color):
-        def shifter(bit_board):
-            return (bit_board << (self._columns - 1))
-        return self.flip_pattern_for_shifter_direction(move_bit_board, player_color, shifter, DIAGONAL_MASK)
-
-    def flip_pattern_diagonally_down_left(self, move_bit_board, player_color):
-        def shifter(bit_board):
-            return (bit_board >> (self._columns - 1))
-        return self.flip_pattern_for_shifter_direction(move_bit_board, player_color, shifter, DIAGONAL_MASK)
-
-    def flip_pattern_diagonally_down_right(self, move_bit_board, player_color):
-        def shifter(bit_board):
-            return (bit_board >> (self._columns + 1))
-        return self.flip_pattern_for_shifter_direction(move_bit_board, player_color, shifter, DIAGONAL_MASK)
-
-    def flip_pattern_for_shifter_direction(self, move_bit_board, player_color, shifter, mask):
-        flip_pattern = 0
-        shifted_move = shifter(move_bit_board)
+            return 0
         (player_board, opponent_board) = self.select_players_and_opponents_board(
             player_color)
-        masked_opponent_board = mask & opponent_board
-        while (shifted_move != 0) and (shifted_move & masked_opponent_board != 0):
-            flip_pattern |= shifted_move
-            shifted_move = shifter(shifted_move)
-        if (player_board & shifted_move) == 0:
-            return 0
-        else:
-            return flip_pattern
+        return self._geometry.flip_pattern(player_board, opponent_board,
+                                           self.board_with_stone_at(move))
 
     def select_players_and_opponents_board(self, player_color):
         if player_color == 'black':
@@ -171,11 +335,19 @@ class BitBoard(Board):
             return (self._white_bit_board, self._black_bit_board)
 
     def board_with_stone_at(self, position):
-        (row, column) = position
-        assert row < self._rows and column < self._columns
-        board = 1 << ((self._rows - row - 1) * self._rows +
-                      (self._columns - column - 1))
-        return board
+        return self._geometry.square_bit(position)
+
+    def position_of(self, bit):
+        return self._geometry.position_of(bit)
+
+    def moves_in_mask(self, mask):
+        # Highest bit first so that moves come out in row-major scan order
+        moves = []
+        while mask != 0:
+            bit = 1 << (mask.bit_length() - 1)
+            moves.append(self.position_of(bit))
+            mask ^= bit
+        return moves
 
     def print_bit_board(self, binary):
         binary_string = str(
@@ -185,16 +357,35 @@ class BitBoard(Board):
             board += str(i) + ":" + \
                 binary_string[i * self._columns: (i + 1) * self._columns]
             board += '\n'
-        self._logger.info("\n  ABCDEFGH\n" + board)
+        self._logger.info("\n  " + COLUMN_LABELS[:self._columns] + "\n" + board)
 
     def as_numpy_matrix(self):
         matrix = np.zeros(self.shape)
-        for x in range(self._columns):
-            for y in range(self._rows):
+        for x in range(self._rows):
+            for y in range(self._columns):
                 position = (x, y)
                 matrix[position] = self.color_of(position)
         return matrix
 
+    def as_bit_boards(self):
+        return (self._black_bit_board, self._white_bit_board)
+
+    def stone_counts(self):
+        return (popcount(self._black_bit_board), popcount(self._white_bit_board))
+
+    def empty_count(self):
+        return self._geometry.square_num - popcount(self._black_bit_board | self._white_bit_board)
+
+    def disc_difference(self, player_color):
+        (player_board, opponent_board) = self.select_players_and_opponents_board(
+            player_color)
+        return popcount(player_board) - popcount(opponent_board)
+
+    def canonical_key(self):
+        # (black, white) of the symmetric position that sorts first; the
+        # same for all eight symmetric copies of this board
+        return self._geometry.canonical_bit_boards(self._black_bit_board, self._white_bit_board)[:2]
+
     def color_of(self, position):
         mask = self.board_with_stone_at(position)
         if mask & self._black_bit_board != 0:
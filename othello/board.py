@@ -32,5 +32,26 @@ class Board(object):
     def next_board_state(self, move, player_color):
         pass
 
+    def make_move(self, move, player_color):
+        pass
+
+    def undo_move(self, move, undo_info, player_color):
+        pass
+
     def as_numpy_matrix(self):
         pass
+
+    def as_bit_boards(self):
+        pass
+
+    def canonical_key(self):
+        pass
+
+    def stone_counts(self):
+        pass
+
+    def empty_count(self):
+        pass
+
+    def disc_difference(self, player_color):
+        pass
@@ -0,0 +1,236 @@
+import numpy as np
+from bit_board import BitBoard, DIRECTIONS, SYMMETRY_NUM, MIRROR_MASKS, TRANSPOSE_MASKS
+from utilities import popcount_bit_boards
+
+# numpy shifts need unsigned shift amounts to stay in uint64
+BATCH_DIRECTIONS = [(np.uint64(abs(shift)), shift > 0, np.uint64(mask))
+                    for (shift, mask) in DIRECTIONS]
+
+MIRROR_BATCH_MASKS = [(np.uint64(shift), np.uint64(mask)) for (shift, mask) in MIRROR_MASKS]
+TRANSPOSE_BATCH_MASKS = [(np.uint64(shift), np.uint64(mask)) for (shift, mask) in TRANSPOSE_MASKS]
+
+
+def shift_bit_boards(bit_boards, shift, left):
+    if left:
+        return np.left_shift(bit_boards, shift)
+    return np.right_shift(bit_boards, shift)
+
+
+def mirror_rows(bit_boards):
+    # Row r moves to row 7 - r, which reverses the bytes
+    return np.asarray(bit_boards, dtype=np.uint64).byteswap()
+
+
+def mirror_columns(bit_boards):
+    bit_boards = np.asarray(bit_boards, dtype=np.uint64)
+    for (shift, mask) in MIRROR_BATCH_MASKS:
+        bit_boards = ((bit_boards >> shift) & mask) | ((bit_boards & mask) << shift)
+    return bit_boards
+
+
+def transpose(bit_boards):
+    bit_boards = np.asarray(bit_boards, dtype=np.uint64)
+    for (shift, mask) in TRANSPOSE_BATCH_MASKS:
+        swapped = mask & (bit_boards ^ (bit_boards << shift))
+        bit_boards = bit_boards ^ swapped ^ (swapped >> shift)
+    return bit_boards
+
+
+def transform_bit_boards(bit_boards, symmetries):
+    # Same numbering as bit_board.transform; symmetries is a single
+    # symmetry number or one per bit board
+    symmetries = np.asarray(symmetries)
+    bit_boards = np.asarray(bit_boards, dtype=np.uint64)
+    bit_boards = np.where(symmetries & 4, transpose(bit_boards), bit_boards)
+    bit_boards = np.where(symmetries & 2, mirror_rows(bit_boards), bit_boards)
+    return np.where(symmetries & 1, mirror_columns(bit_boards), bit_boards)
+
+
+def canonical_bit_boards(player_bit_boards, opponent_bit_boards):
+    # Vectorized bit_board.canonical_bit_boards: the smallest (player,
+    # opponent) pair of every position and the symmetry that produces it
+    player_bit_boards = np.asarray(player_bit_boards, dtype=np.uint64)
+    opponent_bit_boards = np.asarray(opponent_bit_boards, dtype=np.uint64)
+    best_players = player_bit_boards
+    best_opponents = opponent_bit_boards
+    best_symmetries = np.zeros(player_bit_boards.shape, dtype=np.int64)
+    for symmetry in range(1, SYMMETRY_NUM):
+        players = transform_bit_boards(player_bit_boards, symmetry)
+        opponents = transform_bit_boards(opponent_bit_boards, symmetry)
+        smaller = (players < best_players) | ((players == best_players) & (opponents < best_opponents))
+        best_players = np.where(smaller, players, best_players)
+        best_opponents = np.where(smaller, opponents, best_opponents)
+        best_symmetries[smaller] = symmetry
+    return (best_players, best_opponents, best_symmetries)
+
+
+def build_symmetry_squares():
+    # SYMMETRY_SQUARES[symmetry, row * 8 + column] is the square it maps to
+    square_bits = np.array([1 << (63 - square) for square in range(64)], dtype=np.uint64)
+    bit_squares = dict((1 << (63 - square), square) for square in range(64))
+    return np.array([[bit_squares[int(bit)] for bit in transform_bit_boards(square_bits, symmetry)]
+                     for symmetry in range(SYMMETRY_NUM)], dtype=np.int64)
+
+
+SYMMETRY_SQUARES = build_symmetry_squares()
+
+
+def mobility_masks(player_bit_boards, opponent_bit_boards):
+    empty = ~(player_bit_boards | opponent_bit_boards)
+    moves = np.zeros_like(player_bit_boards)
+    for (shift, left, mask) in BATCH_DIRECTIONS:
+        masked_opponent = opponent_bit_boards & mask
+        flood = masked_opponent & shift_bit_boards(player_bit_boards, shift, left)
+        for _ in range(5):
+            flood |= masked_opponent & shift_bit_boards(flood, shift, left)
+        moves |= shift_bit_boards(flood, shift, left)
+    return moves & empty
+
+
+def flip_patterns(player_bit_boards, opponent_bit_boards, move_bit_boards):
+    flips = np.zeros_like(player_bit_boards)
+    for (shift, left, mask) in BATCH_DIRECTIONS:
+        masked_opponent = opponent_bit_boards & mask
+        line = shift_bit_boards(move_bit_boards, shift, left) & masked_opponent
+        for _ in range(5):
+            line |= shift_bit_boards(line, shift, left) & masked_opponent
+        # The only non-line square one step past the line is its end point
+        bounded = (shift_bit_boards(line, shift, left) & player_bit_boards) != 0
+        flips |= np.where(bounded, line, np.uint64(0))
+    return flips
+
+
+def select_random_moves(move_masks, random_state):
+    # One uniformly chosen set bit of each mask, 0 for an empty mask
+    move_masks = np.asarray(move_masks, dtype=np.uint64)
+    counts = popcount_bit_boards(move_masks)
+    skips = (random_state.random_sample(len(counts)) * counts).astype(np.int64)
+    for skip in range(int(skips.max()) if len(skips) else 0):
+        move_masks = np.where(skips > skip, move_masks & (move_masks - np.uint64(1)), move_masks)
+    return move_masks & (~move_masks + np.uint64(1))
+
+
+def random_playouts(player_bit_boards, opponent_bit_boards, random_state):
+    # Plays every position to the end with uniformly random moves and returns
+    # the final disc differences seen from the original side to move
+    player = np.array(player_bit_boards, dtype=np.uint64)
+    opponent = np.array(opponent_bit_boards, dtype=np.uint64)
+    swapped = np.zeros(len(player), dtype=bool)
+    passed = np.zeros(len(player), dtype=bool)
+    playing = np.ones(len(player), dtype=bool)
+    while True:
+        moves = mobility_masks(player, opponent)
+        has_move = moves != 0
+        playing &= has_move | ~passed
+        if not playing.any():
+            break
+        passed = ~has_move
+        move_bits = select_random_moves(np.where(playing, moves, np.uint64(0)), random_state)
+        # A pass has no move and no flips, so it only swaps the sides
+        flips = flip_patterns(player, opponent, move_bits)
+        (player, opponent) = (np.where(playing, opponent ^ flips, player),
+                              np.where(playing, player | move_bits | flips, opponent))
+        swapped ^= playing
+    differences = popcount_bit_boards(player) - popcount_bit_boards(opponent)
+    return np.where(swapped, -differences, differences)
+
+
+# Many positions held as two uint64 arrays, one bit board per position,
+# using the same bit layout as BitBoard.
+class BoardBatch(object):
+    def __init__(self, black_bit_boards, white_bit_boards):
+        self.black = np.asarray(black_bit_boards, dtype=np.uint64)
+        self.white = np.asarray(white_bit_boards, dtype=np.uint64)
+        assert self.black.shape == self.white.shape
+        self.shape = (8, 8)
+
+    @classmethod
+    def initial(cls, size):
+        (black, white) = BitBoard().as_bit_boards()
+        return cls(np.full(size, black, dtype=np.uint64),
+                   np.full(size, white, dtype=np.uint64))
+
+    @classmethod
+    def from_boards(cls, boards):
+        bit_boards = [board.as_bit_boards() for board in boards]
+        return cls([black for (black, _) in bit_boards],
+                   [white for (_, white) in bit_boards])
+
+    def __len__(self):
+        return len(self.black)
+
+    def __getitem__(self, index):
+        return BoardBatch(np.atleast_1d(self.black[index]), np.atleast_1d(self.white[index]))
+
+    def board(self, index):
+        return BitBoard(8, 8, int(self.black[index]), int(self.white[index]))
+
+    def copy(self):
+        return BoardBatch(self.black.copy(), self.white.copy())
+
+    def transform(self, symmetries):
+        return BoardBatch(transform_bit_boards(self.black, symmetries),
+                          transform_bit_boards(self.white, symmetries))
+
+    def canonical_keys(self):
+        # Same keys as Board.canonical_key, one (black, white) pair per position
+        return canonical_bit_boards(self.black, self.white)[:2]
+
+    def select_players_and_opponents_board(self, player_color):
+        # player_color is 'black', 'white' or a boolean array that is True for black
+        if isinstance(player_color, str):
+            if player_color == 'black':
+                return (self.black, self.white)
+            return (self.white, self.black)
+        black_to_move = np.asarray(player_color, dtype=bool)
+        return (np.where(black_to_move, self.black, self.white),
+                np.where(black_to_move, self.white, self.black))
+
+    def legal_moves_mask(self, player_color):
+        (player, opponent) = self.select_players_and_opponents_board(player_color)
+        return mobility_masks(player, opponent)
+
+    def has_valid_move(self, player_color):
+        return self.legal_moves_mask(player_color) != 0
+
+    def is_end_state(self):
+        return ~self.has_valid_move('black') & ~self.has_valid_move('white')
+
+    def flip_patterns(self, move_bit_boards, player_color):
+        (player, opponent) = self.select_players_and_opponents_board(player_color)
+        return flip_patterns(player, opponent, np.asarray(move_bit_boards, dtype=np.uint64))
+
+    def apply_new_moves(self, move_bit_boards, player_color):
+        # A zero move leaves that position unchanged, which is how passes are expressed
+        move_bit_boards = np.asarray(move_bit_boards, dtype=np.uint64)
+        (player, opponent) = self.select_players_and_opponents_board(player_color)
+        flips = flip_patterns(player, opponent, move_bit_boards)
+        move_bit_boards = np.where(flips != 0, move_bit_boards, np.uint64(0))
+        player = player | move_bit_boards | flips
+        opponent = opponent ^ flips
+        if isinstance(player_color, str):
+            black_to_move = player_color == 'black'
+        else:
+            black_to_move = np.asarray(player_color, dtype=bool)
+        return BoardBatch(np.where(black_to_move, player, opponent),
+                          np.where(black_to_move, opponent, player))
+
+    def stone_counts(self):
+        return (popcount_bit_boards(self.black), popcount_bit_boards(self.white))
+
+    def empty_counts(self):
+        return popcount_bit_boards(~(self.black | self.white))
+
+    def disc_differences(self, player_color):
+        (player, opponent) = self.select_players_and_opponents_board(player_color)
+        return popcount_bit_boards(player) - popcount_bit_boards(opponent)
+
+    def as_bit_planes(self, bit_boards):
+        # Big endian bytes put square (0, 0), the top bit, first
+        big_endian = np.ascontiguousarray(bit_boards, dtype='>u8').view(np.uint8)
+        return np.unpackbits(big_endian.reshape(-1, 8), axis=1).reshape(-1, 8, 8)
+
+    def as_numpy_tensor(self):
+        # Same encoding as as_numpy_matrix: black is -1, white is 1
+        return self.as_bit_planes(self.white).astype(np.int8) - \
+            self.as_bit_planes(self.black).astype(np.int8)
@@ -1,7 +1,9 @@
 #include "FastBitBoard.h"
 #include <bitset>
+#include <algorithm>
 #include <cassert>
 #include <iostream>
+#include <stdexcept>
 #include <pybind11/stl.h>
 #include <pybind11/pybind11.h>
 namespace py = pybind11;
@@ -17,7 +19,10 @@ PYBIND11_MODULE(libfastbb, m)
     py::class_<FastBitBoard>(m, "FastBitBoard")
         .def(py::init<>())
         .def(py::init<const int, const int>())
+        .def(py::init<const int, const int, const uint64_t, const uint64_t>())
         .def("apply_new_move", &FastBitBoard::applyNewMove)
+        .def("make_move", &FastBitBoard::makeMove)
+        .def("undo_move", &FastBitBoard::undoMove)
         .def("is_valid_move", &FastBitBoard::isValidMove)
         .def("has_valid_move", &FastBitBoard::hasValidMove)
         .def("is_end_state", &FastBitBoard::isEndState)
@@ -26,16 +31,94 @@ PYBIND11_MODULE(libfastbb, m)
         .def("list_all_empty_positions", &FastBitBoard::listAllEmptyPositions)
         .def("list_all_next_states", &FastBitBoard::listAllNextStates)
         .def("next_board_state", &FastBitBoard::nextBoardState)
-        .def("as_numpy_matrix", &FastBitBoard::asNumpyMatrix);
+        .def("as_numpy_matrix", &FastBitBoard::asNumpyMatrix)
+        .def("as_bit_boards", &FastBitBoard::asBitBoards)
+        .def("canonical_key", &FastBitBoard::canonicalKey)
+        .def_property_readonly("shape", &FastBitBoard::shape)
+        .def("stone_counts", &FastBitBoard::stoneCounts)
+        .def("empty_count", &FastBitBoard::emptyCount)
+        .def("disc_difference", &FastBitBoard::discDifference);
 }
 
 namespace
 {
     const std::string COLOR_BLACK = "black";
     const std::string COLOR_WHITE = "white";
-    const uint64_t UP_DOWN_MASK = 0x00ffffffffffff00;
-    const uint64_t LEFT_RIGHT_MASK = 0x7e7e7e7e7e7e7e7e;
-    const uint64_t DIAGONAL_MASK = UP_DOWN_MASK & LEFT_RIGHT_MASK;
+    const int SYMMETRY_NUM = 8;
+    const int MIN_BOARD_SIZE = 4;
+    const int MAX_BOARD_SIZE = 16;
+
+    // Any even size from MIN_BOARD_SIZE that fits in one 64 bit word; larger
+    // boards need the Python BitBoard
+    uint16_t checkedSize(const int rows, const int columns, const int size)
+    {
+        if (rows % 2 != 0 || columns % 2 != 0 || rows < MIN_BOARD_SIZE || columns < MIN_BOARD_SIZE
+            || rows > MAX_BOARD_SIZE || columns > MAX_BOARD_SIZE || rows * columns > 64) {
+            throw std::invalid_argument("FastBitBoard supports even sizes with at most 64 squares");
+        }
+        return size;
+    }
+
+    uint64_t fullMask(const int rows, const int columns)
+    {
+        return rows * columns == 64 ? ~(uint64_t)0 : ((uint64_t)1 << (rows * columns)) - 1;
+    }
+
+    // Every square except the top and bottom rows
+    uint64_t upDownMask(const int rows, const int columns)
+    {
+        const uint64_t rowMask = ((uint64_t)1 << columns) - 1;
+        return fullMask(rows, columns) & ~rowMask & ~(rowMask << ((rows - 1) * columns));
+    }
+
+    // Every square except the leftmost and rightmost columns
+    uint64_t leftRightMask(const int rows, const int columns)
+    {
+        uint64_t mask = 0;
+        const uint64_t innerRow = (((uint64_t)1 << (columns - 1)) - 1) & ~(uint64_t)1;
+        for (int row = 0; row < rows; ++row) {
+            mask |= innerRow << (row * columns);
+        }
+        return mask;
+    }
+
+    // Same transforms as bit_board.py: row r moves to row 7 - r, column c
+    // to column 7 - c, and square (r, c) to (c, r)
+    uint64_t mirrorRows(const uint64_t board)
+    {
+        return __builtin_bswap64(board);
+    }
+
+    uint64_t mirrorColumns(uint64_t board)
+    {
+        board = ((board >> 1) & 0x5555555555555555) | ((board & 0x5555555555555555) << 1);
+        board = ((board >> 2) & 0x3333333333333333) | ((board & 0x3333333333333333) << 2);
+        return ((board >> 4) & 0x0f0f0f0f0f0f0f0f) | ((board & 0x0f0f0f0f0f0f0f0f) << 4);
+    }
+
+    uint64_t transpose(uint64_t board)
+    {
+        uint64_t swapped = 0x0f0f0f0f00000000 & (board ^ (board << 28));
+        board ^= swapped ^ (swapped >> 28);
+        swapped = 0x3333000033330000 & (board ^ (board << 14));
+        board ^= swapped ^ (swapped >> 14);
+        swapped = 0x5500550055005500 & (board ^ (board << 7));
+        return board ^ swapped ^ (swapped >> 7);
+    }
+
+    // All eight transforms in the symmetry order of bit_board.py: bit 2
+    // transposes, bit 1 mirrors the rows and bit 0 mirrors the columns
+    void symmetricBoards(const uint64_t board, uint64_t (&boards)[SYMMETRY_NUM])
+    {
+        const uint64_t bases[2] = {board, transpose(board)};
+        for (int i = 0; i < 2; ++i) {
+            const uint64_t mirrored = mirrorRows(bases[i]);
+            boards[i * 4] = bases[i];
+            boards[i * 4 + 1] = mirrorColumns(bases[i]);
+            boards[i * 4 + 2] = mirrored;
+            boards[i * 4 + 3] = mirrorColumns(mirrored);
+        }
+    }
 }
 
 FastBitBoard::FastBitBoard() : FastBitBoard(8, 8)
@@ -43,15 +126,21 @@ FastBitBoard::FastBitBoard() : FastBitBoard(8, 8)
 }
 
 FastBitBoard::FastBitBoard(const int rows, const int columns)
-    : mRows(rows), 
-      mColumns(columns) {
+    : mRows(checkedSize(rows, columns, rows)), 
+      mColumns(checkedSize(rows, columns, columns)),
+      mUpDownMask(upDownMask(rows, columns)),
+      mLeftRightMask(leftRightMask(rows, columns)),
+      mDiagonalMask(mUpDownMask & mLeftRightMask) {
         mBlackBitBoard = generateInitialBoard(rows, columns, COLOR_BLACK);
         mWhiteBitBoard = generateInitialBoard(rows, columns, COLOR_WHITE);
 }
 
 FastBitBoard::FastBitBoard(const int rows, const int columns, const uint64_t blackBitBoard, const uint64_t whiteBitBoard)
-    : mRows(rows), 
-    mColumns(columns),
+    : mRows(checkedSize(rows, columns, rows)), 
+    mColumns(checkedSize(rows, columns, columns)),
+    mUpDownMask(upDownMask(rows, columns)),
+    mLeftRightMask(leftRightMask(rows, columns)),
+    mDiagonalMask(mUpDownMask & mLeftRightMask),
     mBlackBitBoard(blackBitBoard), 
     mWhiteBitBoard(whiteBitBoard) {
 }
@@ -72,6 +161,24 @@ void FastBitBoard::applyNewMove(const std::tuple<uint16_t, uint16_t>& move, cons
     if (flipPattern == 0) {
         return;
     }
+    toggleMove(move, flipPattern, playerColor);
+}
+
+uint64_t FastBitBoard::makeMove(const std::tuple<uint16_t, uint16_t>& move, const std::string& playerColor)
+{
+    uint64_t flipPattern = generateFlipPattern(move, playerColor);
+    toggleMove(move, flipPattern, playerColor);
+    return flipPattern;
+}
+
+void FastBitBoard::undoMove(const std::tuple<uint16_t, uint16_t>& move, const uint64_t flipPattern, const std::string& playerColor)
+{
+    toggleMove(move, flipPattern, playerColor);
+}
+
+void FastBitBoard::toggleMove(const std::tuple<uint16_t, uint16_t>& move, const uint64_t flipPattern, const std::string& playerColor)
+{
+    // Applying the same xor twice restores the board
     uint64_t moveBitBoard = boardWithStoneAt(move);
     if (playerColor == COLOR_BLACK) {
         mBlackBitBoard ^= (moveBitBoard | flipPattern);
@@ -158,16 +265,91 @@ bool FastBitBoard::isSameBoardState(const FastBitBoard& target) {
 
 pybind11::array_t<int64_t> FastBitBoard::asNumpyMatrix()
 {
-    pybind11::array_t<int64_t> matrix(std::vector<ptrdiff_t>{8, 8}, new int64_t[mRows * mColumns]());
+    pybind11::array_t<int64_t> matrix(std::vector<ptrdiff_t>{mRows, mColumns}, new int64_t[mRows * mColumns]());
     for (uint8_t x = 0; x < mRows; ++x) {
         for (uint8_t y = 0; y < mColumns; ++y) {
             std::tuple<uint16_t, uint16_t> position = std::make_tuple(x, y);
-            matrix.mutable_data()[x * mRows + y] = colorOf(position);
+            matrix.mutable_data()[x * mColumns + y] = colorOf(position);
         }
     }
     return matrix;
 }
 
+std::tuple<uint64_t, uint64_t> FastBitBoard::asBitBoards()
+{
+    return std::make_tuple(mBlackBitBoard, mWhiteBitBoard);
+}
+
+std::tuple<uint64_t, uint64_t> FastBitBoard::canonicalKey()
+{
+    if (mRows != 8 || mColumns != 8) {
+        // Transposing only maps a square board onto itself
+        const int symmetryNum = mRows == mColumns ? SYMMETRY_NUM : SYMMETRY_NUM / 2;
+        std::tuple<uint64_t, uint64_t> key = std::make_tuple(mBlackBitBoard, mWhiteBitBoard);
+        for (int symmetry = 1; symmetry < symmetryNum; ++symmetry) {
+            key = std::min(key, std::make_tuple(transformBoard(mBlackBitBoard, symmetry),
+                                                transformBoard(mWhiteBitBoard, symmetry)));
+        }
+        return key;
+    }
+    uint64_t blacks[SYMMETRY_NUM];
+    uint64_t whites[SYMMETRY_NUM];
+    symmetricBoards(mBlackBitBoard, blacks);
+    symmetricBoards(mWhiteBitBoard, whites);
+    std::tuple<uint64_t, uint64_t> key = std::make_tuple(blacks[0], whites[0]);
+    for (int symmetry = 1; symmetry < SYMMETRY_NUM; ++symmetry) {
+        key = std::min(key, std::make_tuple(blacks[symmetry], whites[symmetry]));
+    }
+    return key;
+}
+
+std::tuple<int, int> FastBitBoard::shape()
+{
+    return std::make_tuple(static_cast<int>(mRows), static_cast<int>(mColumns));
+}
+
+std::tuple<int, int> FastBitBoard::stoneCounts()
+{
+    return std::make_tuple(__builtin_popcountll(mBlackBitBoard), __builtin_popcountll(mWhiteBitBoard));
+}
+
+int FastBitBoard::emptyCount()
+{
+    return mRows * mColumns - __builtin_popcountll(mBlackBitBoard | mWhiteBitBoard);
+}
+
+int FastBitBoard::discDifference(const std::string& playerColor)
+{
+    const std::tuple<uint64_t, uint64_t> boards = playersAndOpponentsBoard(playerColor);
+    return __builtin_popcountll(std::get<0>(boards)) - __builtin_popcountll(std::get<1>(boards));
+}
+
+uint64_t FastBitBoard::transformBoard(const uint64_t board, const int symmetry)
+{
+    // Square by square version of the 8x8 transforms for the other sizes
+    uint64_t result = 0;
+    for (uint16_t row = 0; row < mRows; ++row) {
+        for (uint16_t column = 0; column < mColumns; ++column) {
+            if ((board & boardWithStoneAt(std::make_tuple(row, column))) == 0) {
+                continue;
+            }
+            uint16_t newRow = row;
+            uint16_t newColumn = column;
+            if (symmetry & 4) {
+                std::swap(newRow, newColumn);
+            }
+            if (symmetry & 2) {
+                newRow = mRows - newRow - 1;
+            }
+            if (symmetry & 1) {
+                newColumn = mColumns - newColumn - 1;
+            }
+            result |= boardWithStoneAt(std::make_tuple(newRow, newColumn));
+        }
+    }
+    return result;
+}
+
 int64_t FastBitBoard::colorOf(std::tuple<uint16_t, uint16_t>& position) {
     uint64_t mask = boardWithStoneAt(position);
     if ((mask & mBlackBitBoard) != 0) {
@@ -201,7 +383,7 @@ uint64_t FastBitBoard::boardWithStoneAt(const std::tuple<uint16_t, uint16_t>& po
     assert(row < mRows && column < mColumns);
 
     // Must cast to uint64_t or will be treated as 32bit(environment dependent)
-    return ((uint64_t)1 << ((mRows - row - 1) * mRows + (mColumns - column - 1)));
+    return ((uint64_t)1 << ((mRows - row - 1) * mColumns + (mColumns - column - 1)));
 }
 
 uint64_t FastBitBoard::generateFlipPattern(const std::tuple<std::uint16_t, uint16_t>& move, const std::string& playerColor)
@@ -227,56 +409,56 @@ uint64_t FastBitBoard::flipPatternVerticallyUp(const uint64_t& board, const std:
 {
     return flipPatternForShifterDirection(board, playerColor, [this](const uint64_t& board) -> uint64_t {
         return board << (this->mColumns);
-    }, UP_DOWN_MASK);
+    }, mUpDownMask);
 }
 
 uint64_t FastBitBoard::flipPatternVerticallyDown(const uint64_t& board, const std::string& playerColor)
 {
     return flipPatternForShifterDirection(board, playerColor, [this](const uint64_t& board) -> uint64_t {
         return board >> (this->mColumns);
-    }, UP_DOWN_MASK);
+    }, mUpDownMask);
 }
 
 uint64_t FastBitBoard::flipPatternHorizontallyLeft(const uint64_t& board, const std::string& playerColor)
 {
     return flipPatternForShifterDirection(board, playerColor, [this](const uint64_t& board) -> uint64_t {
         return board << (1);
-    }, LEFT_RIGHT_MASK);
+    }, mLeftRightMask);
 }
 
 uint64_t FastBitBoard::flipPatternHorizontallyRight(const uint64_t& board, const std::string& playerColor)
 {
     return flipPatternForShifterDirection(board, playerColor, [this](const uint64_t& board) -> uint64_t {
         return board >> (1);
-    }, LEFT_RIGHT_MASK);
+    }, mLeftRightMask);
 }
 
 uint64_t FastBitBoard::flipPatternDiagonallyUpLeft(const uint64_t& board, const std::string& playerColor)
 {
     return flipPatternForShifterDirection(board, playerColor, [this](const uint64_t& board) -> uint64_t {
         return board << (this->mColumns + 1);
-    }, DIAGONAL_MASK);
+    }, mDiagonalMask);
 }
 
 uint64_t FastBitBoard::flipPatternDiagonnalyUpRight(const uint64_t& board, const std::string& playerColor)
 {
     return flipPatternForShifterDirection(board, playerColor, [this](const uint64_t& board) -> uint64_t {
         return board << (this->mColumns - 1);
-    }, DIAGONAL_MASK);
+    }, mDiagonalMask);
 }
 
 uint64_t FastBitBoard::flipPatternDiagonallyDownLeft(const uint64_t& board, const std::string& playerColor)
 {
     return flipPatternForShifterDirection(board, playerColor, [this](const uint64_t& board) -> uint64_t {
         return board >> (this->mColumns - 1);
-    }, DIAGONAL_MASK);
+    }, mDiagonalMask);
 }
 
 uint64_t FastBitBoard::flipPatternDiagonallyDownRight(const uint64_t& board, const std::string& playerColor)
 {
     return flipPatternForShifterDirection(board, playerColor, [this](const uint64_t& board) -> uint64_t {
         return board >> (this->mColumns + 1);
-    }, DIAGONAL_MASK);
+    }, mDiagonalMask);
 }
 
 uint64_t FastBitBoard::flipPatternForShifterDirection(const uint64_t& board, const std::string& playerColor,
@@ -15,6 +15,8 @@ public:
     FastBitBoard(const int rows, const int columns, const uint64_t blackBitBoard, const uint64_t whiteBitBoard);
     ~FastBitBoard();
     void applyNewMove(const std::tuple<uint16_t, uint16_t>& move, const std::string& playerColor);
+    uint64_t makeMove(const std::tuple<uint16_t, uint16_t>& move, const std::string& playerColor);
+    void undoMove(const std::tuple<uint16_t, uint16_t>& move, const uint64_t flipPattern, const std::string& playerColor);
     bool isValidMove(const std::tuple<uint16_t, uint16_t>& move, const std::string& playerColor);
     bool hasValidMove(const std::string& playerColor);
     bool isEndState();
@@ -24,17 +26,27 @@ public:
     std::vector<FastBitBoard> listAllNextStates(const std::string& playerColor);
     FastBitBoard nextBoardState(const std::tuple<uint16_t, uint16_t>& move, const std::string& playerColor);
     pybind11::array_t<int64_t> asNumpyMatrix();
+    std::tuple<uint64_t, uint64_t> asBitBoards();
+    std::tuple<uint64_t, uint64_t> canonicalKey();
+    std::tuple<int, int> shape();
+    std::tuple<int, int> stoneCounts();
+    int emptyCount();
+    int discDifference(const std::string& playerColor);
 
 protected:
 private:
     const uint16_t mRows;
     const uint16_t mColumns;
+    const uint64_t mUpDownMask;
+    const uint64_t mLeftRightMask;
+    const uint64_t mDiagonalMask;
     uint64_t mBlackBitBoard;
     uint64_t mWhiteBitBoard;
 
     std::tuple<uint64_t, uint64_t> playersAndOpponentsBoard(const std::string& playerColor);
     bool isSameBoardState(const FastBitBoard& target);
     uint64_t generateInitialBoard(const std::uint16_t rows, const std::uint16_t columns, const std::string& color);
+    void toggleMove(const std::tuple<uint16_t, uint16_t>& move, const uint64_t flipPattern, const std::string& playerColor);
     uint64_t boardWithStoneAt(const std::tuple<uint16_t, uint16_t>& position);
     uint64_t generateFlipPattern(const std::tuple<uint16_t, uint16_t>& move, const std::string& playerColor);
     uint64_t flipPatternVerticallyUp(const std::uint64_t& board, const std::string& playerColor);
@@ -48,6 +60,7 @@ private:
     uint64_t flipPatternForShifterDirection(const std::uint64_t& board, const std::string& playerColor,
         const std::function<uint64_t(const std::uint64_t&)> shifter, const std::uint64_t& mask);
     int64_t colorOf(std::tuple<uint16_t, uint16_t>& position);
+    uint64_t transformBoard(const uint64_t board, const int symmetry);
 };
 
 #endif
\ No newline at end of file
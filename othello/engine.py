@@ -8,20 +8,32 @@ from bit_board import BitBoard
 from libfastbb import FastBitBoard
 
 class Engine(object):
-    def __init__(self, player_black, player_white, board_rows, board_columns):
+    def __init__(self, player_black, player_white, board_rows, board_columns, time_budget=None):
         self._board_rows = board_rows
         self._board_columns = board_columns
         self._player_black = player_black
         self._player_black.set_color('black')
         self._player_white = player_white
         self._player_white.set_color('white')
+        self._time_budget = time_budget
         self._is_playing = False
         self._logger = getLogger(__name__)
         self._board_state_change_listener = None
+        self._move_history = []
+        self._game_thread = None
 
     def reset(self):
-        self._board_state = FastBitBoard(self._board_rows, self._board_columns) 
+        self._board_state = self.new_board_state()
+        self._move_history = []
         self._is_playing = False
+        self._player_black.new_game()
+        self._player_white.new_game()
+
+    def new_board_state(self):
+        # FastBitBoard holds at most 64 squares
+        if self._board_rows * self._board_columns <= 64:
+            return FastBitBoard(self._board_rows, self._board_columns)
+        return BitBoard(self._board_rows, self._board_columns)
 
     def board_size(self):
         return (self._board_rows, self._board_columns)
@@ -29,19 +41,38 @@ class Engine(object):
     def board_state(self):
         return self._board_state
 
+    def move_history(self):
+        return self._move_history
+
+    def set_time_budget(self, time_budget):
+        self._time_budget = time_budget
+
     def start_game(self):
         if self._is_playing:
             return
+        # A stopped game may still be unwinding its cancelled search
+        self.join()
         #self._board_state = MatrixBoard(self._board_rows, self._board_columns)
-        self._board_state = FastBitBoard(self._board_rows, self._board_columns) 
+        self._board_state = self.new_board_state()
+        self._move_history = []
+        self._player_black.new_game()
+        self._player_white.new_game()
         self.notify_new_board_state(self._board_state.as_numpy_matrix())
+        self._is_playing = True
         self._game_thread = threading.Thread(
-            target=self.run_one_game, name='game_thread')
+            target=self.play_game, name='game_thread')
         self._game_thread.start()
 
+    def restart_game(self):
+        self.stop_game()
+        self.start_game()
+
     def run_one_game(self):
-        transitions = [self._board_state.as_numpy_matrix()]
         self._is_playing = True
+        return self.play_game()
+
+    def play_game(self):
+        transitions = [self._board_state.as_numpy_matrix()]
         while self._is_playing:
             stone_num = utilities.count_stone_num(self._board_state)
             self._logger.info('playing!! (black, white): %s', str(stone_num))
@@ -57,6 +88,7 @@ class Engine(object):
             transitions.append(self._board_state.as_numpy_matrix())
             after = time.time()
             self._logger.debug("Time took for searching next move: %s", str(after - before))
+        self._is_playing = False
         (black_stone, white_stone) = utilities.count_stone_num(self._board_state)
         winner = 'black' if black_stone > white_stone else 'white'
         return transitions, winner
@@ -65,10 +97,11 @@ class Engine(object):
         if not self.has_valid_move(player, board_state):
             self._logger.info("No valid moves for: " + player.color())
             return
-        move = player.select_move(board_state)
-        while not board_state.is_valid_move(move, player.color()) and self._is_playing:
-            move = player.select_move(board_state)
-        if move is not None:
+        move = player.select_move(board_state, self._time_budget)
+        while self._is_playing and (move is None or not board_state.is_valid_move(move, player.color())):
+            move = player.select_move(board_state, self._time_budget)
+        # A move that arrives after stop_game belongs to a cancelled search
+        if self._is_playing:
             self.apply_new_move(move, player)
 
     def stop_game(self):
@@ -77,11 +110,17 @@ class Engine(object):
         self._is_playing = False
         self._player_black.force_kill()
         self._player_white.force_kill()
-        self._game_thread.kill_received = True
+        self.join()
+
+    def join(self, timeout=None):
+        game_thread = self._game_thread
+        if game_thread is not None and game_thread is not threading.current_thread():
+            game_thread.join(timeout)
 
     def apply_new_move(self, move, player):
         board_state = self._board_state
         board_state.apply_new_move(move, player.color())
+        self._move_history.append((player.color(), move))
         self.notify_new_board_state(self._board_state.as_numpy_matrix())
 
     def has_valid_move(self, player, board_state):
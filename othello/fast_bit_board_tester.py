@@ -18,7 +18,13 @@ class FastBitBoardTester(Board):
         return self._impl.is_valid_move(move, player_color)
 
     def apply_new_move(self, move, player_color):
-        return self._impl.apply_valid_move(move, player_color)
+        return self._impl.apply_new_move(move, player_color)
+
+    def make_move(self, move, player_color):
+        return self._impl.make_move(move, player_color)
+
+    def undo_move(self, move, flip_pattern, player_color):
+        return self._impl.undo_move(move, flip_pattern, player_color)
 
     def has_valid_move(self, player_color):
         return self._impl.has_valid_move(player_color)
@@ -51,6 +57,21 @@ class FastBitBoardTester(Board):
     def as_numpy_matrix(self):
         return self._impl.as_numpy_matrix()
 
+    def as_bit_boards(self):
+        return self._impl.as_bit_boards()
+
+    def stone_counts(self):
+        return self._impl.stone_counts()
+
+    def empty_count(self):
+        return self._impl.empty_count()
+
+    def disc_difference(self, player_color):
+        return self._impl.disc_difference(player_color)
+
+    def canonical_key(self):
+        return self._impl.canonical_key()
+
     def next_board_state(self, move, player_color):
         return self._impl.next_board_state(move, player_color)
 
@@ -0,0 +1,200 @@
+import os
+import numpy as np
+from bit_board import BitBoard, popcount
+import utilities
+
+MAGIC = b'OTHR'
+VERSION = 1
+MAX_PLIES = 60
+NO_MOVE = 255
+
+# Sidecar file with one ply count byte per game, so that readers can index
+# positions without touching every record
+PLY_COUNTS_SUFFIX = '.plies'
+
+HEADER_DTYPE = np.dtype([('magic', 'S4'),
+                         ('version', '<u2'),
+                         ('max_plies', '<u2'),
+                         ('record_size', '<u4'),
+                         ('reserved', '<u4')])
+
+# One fixed-size record per game. Ply i is the i-th stone placed (passes are
+# not plies); black[i]/white[i] is the position before it and the entry at
+# ply_count the final position. Bit i of white_moves is set when white
+# placed the i-th stone. winner uses color numbers, 0 for a draw.
+GAME_RECORD_DTYPE = np.dtype([('ply_count', '<u1'),
+                              ('black_stones', '<u1'),
+                              ('white_stones', '<u1'),
+                              ('winner', '<i1'),
+                              ('reserved', '<u4'),
+                              ('white_moves', '<u8'),
+                              ('moves', '<u1', (MAX_PLIES,)),
+                              ('black', '<u8', (MAX_PLIES + 1,)),
+                              ('white', '<u8', (MAX_PLIES + 1,))])
+
+
+def encode_move(move):
+    (row, column) = move
+    return row * 8 + column
+
+
+def decode_move(square):
+    return (int(square) // 8, int(square) % 8)
+
+
+def build_game_record(moves):
+    assert len(moves) <= MAX_PLIES
+    record = np.zeros(1, dtype=GAME_RECORD_DTYPE)[0]
+    record['moves'][:] = NO_MOVE
+    board_state = BitBoard()
+    white_moves = 0
+    for (ply, (player_color, move)) in enumerate(moves):
+        (record['black'][ply], record['white'][ply]) = board_state.as_bit_boards()
+        record['moves'][ply] = encode_move(move)
+        if player_color == 'white':
+            white_moves |= 1 << ply
+        board_state.apply_new_move(tuple(move), player_color)
+    (black, white) = board_state.as_bit_boards()
+    (record['black'][len(moves)], record['white'][len(moves)]) = (black, white)
+    (black_stone, white_stone) = (popcount(black), popcount(white))
+    record['ply_count'] = len(moves)
+    record['white_moves'] = white_moves
+    record['black_stones'] = black_stone
+    record['white_stones'] = white_stone
+    if black_stone != white_stone:
+        winner = 'black' if black_stone > white_stone else 'white'
+        record['winner'] = utilities.color_string_to_number(winner)
+    return record
+
+
+class GameRecordWriter(object):
+    def __init__(self, path):
+        self._path = path
+        is_new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not is_new_file:
+            read_header(path)
+            write_ply_counts(path)
+        self._file = open(path, 'ab')
+        self._ply_counts_file = open(path + PLY_COUNTS_SUFFIX, 'wb' if is_new_file else 'ab')
+        if is_new_file:
+            header = np.zeros(1, dtype=HEADER_DTYPE)
+            header['magic'] = MAGIC
+            header['version'] = VERSION
+            header['max_plies'] = MAX_PLIES
+            header['record_size'] = GAME_RECORD_DTYPE.itemsize
+            self._file.write(header.tobytes())
+
+    def append(self, moves):
+        # moves is the game as a list of (player_color, (row, column)) in play order
+        record = build_game_record(moves)
+        self._file.write(record.tobytes())
+        self._ply_counts_file.write(record['ply_count'].tobytes())
+
+    def flush(self):
+        self._file.flush()
+        self._ply_counts_file.flush()
+
+    def close(self):
+        self._file.close()
+        self._ply_counts_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_header(path):
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) != 1 or header['magic'][0] != MAGIC:
+        raise ValueError('Not a game record file: ' + path)
+    if header['version'][0] != VERSION or header['record_size'][0] != GAME_RECORD_DTYPE.itemsize:
+        raise ValueError('Unsupported game record version: ' + str(header['version'][0]))
+    return header[0]
+
+
+def game_count(path):
+    return (os.path.getsize(path) - HEADER_DTYPE.itemsize) // GAME_RECORD_DTYPE.itemsize
+
+
+def write_ply_counts(path):
+    # Rebuilds a missing or stale sidecar from the records themselves
+    ply_counts_path = path + PLY_COUNTS_SUFFIX
+    game_num = game_count(path)
+    if os.path.exists(ply_counts_path) and os.path.getsize(ply_counts_path) == game_num:
+        return
+    ply_counts = np.zeros(0, dtype=np.uint8)
+    if game_num > 0:
+        records = np.memmap(path, dtype=GAME_RECORD_DTYPE, mode='r',
+                            offset=HEADER_DTYPE.itemsize, shape=(game_num,))
+        ply_counts = np.asarray(records['ply_count'], dtype=np.uint8)
+    ply_counts.tofile(ply_counts_path)
+
+
+class GameRecordReader(object):
+    def __init__(self, path):
+        read_header(path)
+        self._path = path
+        game_num = game_count(path)
+        if game_num == 0:
+            self._records = np.zeros(0, dtype=GAME_RECORD_DTYPE)
+        else:
+            self._records = np.memmap(path, dtype=GAME_RECORD_DTYPE, mode='r',
+                                      offset=HEADER_DTYPE.itemsize, shape=(game_num,))
+        self._ply_counts = None
+        self._position_ends = None
+
+    def __len__(self):
+        return len(self._records)
+
+    def records(self):
+        return self._records
+
+    def moves(self, game_index):
+        record = self._records[game_index]
+        white_moves = int(record['white_moves'])
+        return [('white' if (white_moves >> ply) & 1 else 'black', decode_move(record['moves'][ply]))
+                for ply in range(record['ply_count'])]
+
+    def position(self, game_index, ply):
+        record = self._records[game_index]
+        assert ply <= record['ply_count']
+        return (int(record['black'][ply]), int(record['white'][ply]))
+
+    def position_index(self):
+        # Ply counts and their running totals, one entry per game. Flat
+        # position indices count the positions that have a move played from
+        # them, game by game.
+        if self._position_ends is None:
+            ply_counts_path = self._path + PLY_COUNTS_SUFFIX
+            # A writer may have appended games since the records were mapped
+            if os.path.exists(ply_counts_path) and os.path.getsize(ply_counts_path) >= len(self._records):
+                ply_counts = np.fromfile(ply_counts_path, dtype=np.uint8, count=len(self._records))
+            else:
+                ply_counts = np.asarray(self._records['ply_count'], dtype=np.uint8)
+            self._ply_counts = ply_counts
+            self._position_ends = np.cumsum(ply_counts, dtype=np.int64)
+        return (self._ply_counts, self._position_ends)
+
+    def position_count(self):
+        position_ends = self.position_index()[1]
+        return int(position_ends[-1]) if len(position_ends) > 0 else 0
+
+    def positions(self, indices):
+        # Vectorized random access by flat position index; only the touched records are read
+        (ply_counts, position_ends) = self.position_index()
+        indices = np.asarray(indices, dtype=np.int64)
+        games = np.searchsorted(position_ends, indices, side='right')
+        plies = indices - (position_ends[games] - ply_counts[games])
+        records = self._records[games]
+        player_is_white = (records['white_moves'] >> plies.astype(np.uint64)) & np.uint64(1)
+        return {'black': records['black'][np.arange(len(games)), plies],
+                'white': records['white'][np.arange(len(games)), plies],
+                'move': records['moves'][np.arange(len(games)), plies],
+                'black_to_move': player_is_white == 0,
+                'winner': records['winner'],
+                'black_stones': records['black_stones'],
+                'white_stones': records['white_stones'],
+                'game': games,
+                'ply': plies}
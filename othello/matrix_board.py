@@ -1,10 +1,69 @@
+import binascii
 import numpy as np
 import utilities
 from board import Board
-
-# Othello board implementation based on numpy matrix(2d-array)
-
-
+from bit_board import board_geometry
+
+# (row, column) steps of the eight directions
+MATRIX_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1),
+                     (-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def step_squares(rows, columns, row_step, column_step):
+    # The square one step from each square, or the off-board square
+    # rows * columns when the step leaves the board
+    squares = np.full(rows * columns + 1, rows * columns, dtype=np.intp)
+    for row in range(rows):
+        for column in range(columns):
+            if 0 <= row + row_step < rows and 0 <= column + column_step < columns:
+                squares[row * columns + column] = (row + row_step) * columns + column + column_step
+    return squares
+
+
+# Index tables of one board size over the flattened board with one extra
+# off-board square at the end. It always holds 0, so every walk off the
+# board ends on an empty square.
+class MatrixGeometry(object):
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        self.square_num = rows * columns
+        direction_num = len(MATRIX_DIRECTIONS)
+        nexts = np.array([step_squares(rows, columns, row_step, column_step)
+                          for (row_step, column_step) in MATRIX_DIRECTIONS])
+        # previous[d, s] is the square one step back from s in direction d;
+        # flat_previous indexes the same squares in a flattened (d, s) array
+        self.previous = np.array([step_squares(rows, columns, -row_step, -column_step)
+                                  for (row_step, column_step) in MATRIX_DIRECTIONS])
+        self.flat_previous = self.previous + \
+            (self.square_num + 1) * np.arange(direction_num)[:, np.newaxis]
+        # rays[d, s, k] is the square k + 1 steps from s in direction d. No
+        # ray has more than max(rows, columns) - 1 squares on the board, so
+        # the last one is always off the board.
+        ray_length = max(rows, columns)
+        self.rays = np.empty((direction_num, self.square_num + 1, ray_length), dtype=np.intp)
+        squares = np.tile(np.arange(self.square_num + 1), (direction_num, 1))
+        for step in range(ray_length):
+            squares = np.take_along_axis(nexts, squares, axis=1)
+            self.rays[:, :, step] = squares
+        # A line of opponent stones is at most the board length minus two
+        self.flood_steps = max(rows, columns) - 3
+
+
+MATRIX_GEOMETRIES = {}
+
+
+def matrix_geometry(rows, columns):
+    geometry = MATRIX_GEOMETRIES.get((rows, columns))
+    if geometry is None:
+        geometry = MatrixGeometry(rows, columns)
+        MATRIX_GEOMETRIES[(rows, columns)] = geometry
+    return geometry
+
+
+# Othello board implementation based on numpy matrix(2d-array). Moves and
+# flips are found with whole-array operations over index tables instead of
+# walking the directions square by square.
 class MatrixBoard(Board):
     def __init__(self, rows=8, columns=8, board_state=None):
         super(MatrixBoard, self).__init__()
@@ -15,6 +74,7 @@ class MatrixBoard(Board):
             self._board_state = self.generate_initial_board_state(
                 rows, columns)
         self.shape = self._board_state.shape
+        self._geometry = matrix_geometry(rows, columns)
 
     def is_valid_move(self, move, player_color):
         if move == None:
@@ -22,150 +82,57 @@ class MatrixBoard(Board):
         if not self.is_empty_position(move):
             # Stone is already placed
             return False
-        if self.can_take_stones_vertically_up(move, player_color):
-            return True
-        if self.can_take_stones_vertically_down(move, player_color):
-            return True
-        if self.can_take_stones_horizontally_left(move, player_color):
-            return True
-        if self.can_take_stones_horizontally_right(move, player_color):
-            return True
-        if self.can_take_stones_diagonally_up_left(move, player_color):
-            return True
-        if self.can_take_stones_diagonally_up_right(move, player_color):
-            return True
-        if self.can_take_stones_diagonally_down_left(move, player_color):
-            return True
-        if self.can_take_stones_diagonally_down_right(move, player_color):
-            return True
-        return False
+        return len(self.flip_squares(move, player_color)) != 0
 
     def apply_new_move(self, move, player_color):
-        if self.can_take_stones_vertically_up(move, player_color):
-            self.flip_stones_vertically_up(move, player_color)
-        if self.can_take_stones_vertically_down(move, player_color):
-            self.flip_stones_vertically_down(move, player_color)
-        if self.can_take_stones_horizontally_left(move, player_color):
-            self.flip_stones_horizontally_left(move, player_color)
-        if self.can_take_stones_horizontally_right(move, player_color):
-            self.flip_stones_horizontally_right(move, player_color)
-        if self.can_take_stones_diagonally_up_left(move, player_color):
-            self.flip_stones_diagonally_up_left(move, player_color)
-        if self.can_take_stones_diagonally_up_right(move, player_color):
-            self.flip_stones_diagonally_up_right(move, player_color)
-        if self.can_take_stones_diagonally_down_left(move, player_color):
-            self.flip_stones_diagonally_down_left(move, player_color)
-        if self.can_take_stones_diagonally_down_right(move, player_color):
-            self.flip_stones_diagonally_down_right(move, player_color)
-        self.place_stone_to(move, player_color)
-
-    def flip_stones_vertically_up(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x, y + step)
-        return self.flip_stones_in_accumulator_direction(move, player_color, accumulator)
-
-    def flip_stones_vertically_down(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x, y - step)
-        return self.flip_stones_in_accumulator_direction(move, player_color, accumulator)
-
-    def flip_stones_horizontally_left(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x - step, y)
-        return self.flip_stones_in_accumulator_direction(move, player_color, accumulator)
-
-    def flip_stones_horizontally_right(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x + step, y)
-        return self.flip_stones_in_accumulator_direction(move, player_color, accumulator)
-
-    def flip_stones_diagonally_up_left(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x - step, y + step)
-        return self.flip_stones_in_accumulator_direction(move, player_color, accumulator)
-
-    def flip_stones_diagonally_up_right(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x + step, y + step)
-        return self.flip_stones_in_accumulator_direction(move, player_color, accumulator)
-
-    def flip_stones_diagonally_down_left(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x - step, y - step)
-        return self.flip_stones_in_accumulator_direction(move, player_color, accumulator)
-
-    def flip_stones_diagonally_down_right(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x + step, y - step)
-        return self.flip_stones_in_accumulator_direction(move, player_color, accumulator)
-
-    def flip_stones_in_accumulator_direction(self, move, player_color, accumulator):
-        (x, y) = move
-        (rows, columns) = self.shape
-        for i in range(1, max(rows, columns), 1):
-            position = accumulator(x, y, i)
-            if self.is_out_of_board(position):
-                break
-            if not self.flip_stone_at(position, player_color):
-                break
-
-    def can_take_stones_vertically_up(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x, y + step)
-        return self.can_take_stone_in_accumulator_direction(move, player_color, accumulator)
-
-    def can_take_stones_vertically_down(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x, y - step)
-        return self.can_take_stone_in_accumulator_direction(move, player_color, accumulator)
-
-    def can_take_stones_horizontally_left(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x - step, y)
-        return self.can_take_stone_in_accumulator_direction(move, player_color, accumulator)
-
-    def can_take_stones_horizontally_right(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x + step, y)
-        return self.can_take_stone_in_accumulator_direction(move, player_color, accumulator)
-
-    def can_take_stones_diagonally_up_left(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x - step, y + step)
-        return self.can_take_stone_in_accumulator_direction(move, player_color, accumulator)
-
-    def can_take_stones_diagonally_up_right(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x + step, y + step)
-        return self.can_take_stone_in_accumulator_direction(move, player_color, accumulator)
-
-    def can_take_stones_diagonally_down_left(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x - step, y - step)
-        return self.can_take_stone_in_accumulator_direction(move, player_color, accumulator)
-
-    def can_take_stones_diagonally_down_right(self, move, player_color):
-        def accumulator(x, y, step):
-            return (x + step, y - step)
-        return self.can_take_stone_in_accumulator_direction(move, player_color, accumulator)
-
-    def can_take_stone_in_accumulator_direction(self, move, player_color, accumulator):
-        (x, y) = move
-        (rows, columns) = self._board_state.shape
+        self.make_move(move, player_color)
+
+    def make_move(self, move, player_color):
+        # Returns the flattened indices of the flipped stones for undo_move
         color_number = utilities.color_string_to_number(player_color)
-        for i in range(1, max(rows, columns), 1):
-            position = accumulator(x, y, i)
-            if self.is_out_of_board(position) or self.is_empty_position(position):
-                break
-            if (self._board_state[position] == color_number):
-                if i != 1:
-                    return True
-                else:
-                    return False
-        return False
+        flipped_squares = self.flip_squares(move, player_color)
+        self._board_state.flat[flipped_squares] = color_number
+        self._board_state[move] = color_number
+        return flipped_squares
+
+    def undo_move(self, move, flipped_squares, player_color):
+        opponent_color_number = -utilities.color_string_to_number(player_color)
+        self._board_state.flat[flipped_squares] = opponent_color_number
+        self._board_state[move] = 0
+
+    def padded_squares(self):
+        # The flattened board followed by the off-board square
+        return np.append(self._board_state.ravel(), 0)
+
+    def flip_squares(self, move, player_color):
+        # Looks along all eight rays from the move at once: a ray flips its
+        # leading run of opponent stones when a player stone ends the run
+        (row, column) = move
+        color_number = utilities.color_string_to_number(player_color)
+        rays = self._geometry.rays[:, row * self.shape[1] + column]
+        lines = self.padded_squares()[rays]
+        runs = np.logical_and.accumulate(lines == -color_number, axis=1)
+        run_lengths = runs.sum(axis=1)
+        closed = lines[np.arange(len(lines)), run_lengths] == color_number
+        return rays[runs & closed[:, np.newaxis]]
+
+    def legal_moves_matrix(self, player_color):
+        # Boolean matrix of the legal moves. Opponent runs are flooded out of
+        # the player stones in all eight directions together, as the bit
+        # boards do with shifts.
+        geometry = self._geometry
+        color_number = utilities.color_string_to_number(player_color)
+        squares = self.padded_squares()
+        player = squares == color_number
+        opponent = squares == -color_number
+        flood = opponent & player[geometry.previous]
+        for _ in range(geometry.flood_steps):
+            flood |= opponent & flood.ravel()[geometry.flat_previous]
+        moves = (flood.ravel()[geometry.flat_previous] & (squares == 0)).any(axis=0)
+        return moves[:-1].reshape(self.shape)
 
     def has_valid_move(self, player_color):
-        return len(self.list_all_valid_moves(player_color)) != 0
+        return bool(self.legal_moves_matrix(player_color).any())
 
     def is_end_state(self):
         return not self.has_valid_move('black') and not self.has_valid_move('white')
@@ -178,43 +145,33 @@ class MatrixBoard(Board):
     def is_empty_position(self, position):
         return self._board_state[position] == 0
 
+    def positions_in_matrix(self, matrix):
+        columns = self.shape[1]
+        return [divmod(int(square), columns) for square in np.flatnonzero(matrix)]
+
     def list_all_valid_moves(self, player_color):
-        empty_positions = self.list_all_empty_positions()
-        valid_moves = []
-        for move in empty_positions:
-            if self.is_valid_move(move, player_color):
-                valid_moves.append(move)
-        return valid_moves
+        return self.positions_in_matrix(self.legal_moves_matrix(player_color))
 
     def list_all_next_states(self, player_color):
-        empty_positions = self.list_all_empty_positions()
         next_states = []
-        for move in empty_positions:
-            if self.is_valid_move(move, player_color):
-                next_states.append(self.next_board_state(move, player_color))
+        for move in self.list_all_valid_moves(player_color):
+            next_states.append(self.next_board_state(move, player_color))
         return next_states
 
     def list_all_empty_positions(self):
-        positions = []
-        (rows, columns) = self._board_state.shape
-        for x in range(rows):
-            for y in range(columns):
-                position = (x, y)
-                if self.is_empty_position(position):
-                    positions.append(position)
-        return positions
+        return self.positions_in_matrix(self._board_state == 0)
 
     def next_board_state(self, move, player_color):
-        color_number = utilities.color_string_to_number(player_color)
-        next_state = np.copy(self._board_state)
-        next_state[move] = color_number
-        return MatrixBoard(board_state=next_state)
+        (rows, columns) = self.shape
+        next_board = MatrixBoard(rows, columns, np.copy(self._board_state))
+        next_board.apply_new_move(move, player_color)
+        return next_board
 
     def generate_initial_board_state(self, rows, columns):
         board_state = np.zeros(
             shape=(rows, columns), dtype='int32')
-        x_center = rows / 2
-        y_center = columns / 2
+        x_center = rows // 2
+        y_center = columns // 2
         board_state[(x_center - 1, y_center)] = -1
         board_state[(x_center, y_center)] = 1
         board_state[(x_center, y_center - 1)] = -1
@@ -225,13 +182,39 @@ class MatrixBoard(Board):
         self._board_state[position] = utilities.color_string_to_number(
             player_color)
 
-    def flip_stone_at(self, position, player_color):
-        color_number = utilities.color_string_to_number(player_color)
-        if self._board_state[position] != color_number:
-            self._board_state[position] = color_number
-            return True
-        else:
-            return False
-
     def as_numpy_matrix(self):
         return self._board_state
+
+    def as_bit_boards(self):
+        flat_state = self._board_state.flatten()
+        black = self.pack_bits(
+            flat_state == utilities.color_string_to_number('black'))
+        white = self.pack_bits(
+            flat_state == utilities.color_string_to_number('white'))
+        return (black, white)
+
+    def square_counts(self):
+        # One pass counting black (-1), empty (0) and white (1) squares
+        return np.bincount((self._board_state + 1).ravel(), minlength=3)
+
+    def stone_counts(self):
+        counts = self.square_counts()
+        return (int(counts[0]), int(counts[2]))
+
+    def empty_count(self):
+        return int(np.count_nonzero(self._board_state == 0))
+
+    def disc_difference(self, player_color):
+        # Black stones are -1 and white ones 1, so the sum is white minus black
+        white_difference = int(self._board_state.sum())
+        return white_difference if player_color == 'white' else -white_difference
+
+    def canonical_key(self):
+        (black, white) = self.as_bit_boards()
+        (rows, columns) = self.shape
+        return board_geometry(rows, columns).canonical_bit_boards(black, white)[:2]
+
+    def pack_bits(self, bits):
+        # First square becomes the most significant bit, as in BitBoard
+        packed = np.packbits(bits.astype('uint8')).tobytes()
+        return int(binascii.hexlify(packed), 16) >> (-len(bits) % 8)
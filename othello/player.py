@@ -8,7 +8,10 @@ class Player(object):
     def color(self):
         return self._color
 
-    def select_move(self, board_state):
+    def new_game(self):
+        pass
+
+    def select_move(self, board_state, time_budget=None):
         pass
 
     def force_kill(self):
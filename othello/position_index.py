@@ -0,0 +1,251 @@
+import numpy as np
+from bit_board import FULL_MASK, canonical_bit_boards
+from board_batch import canonical_bit_boards as canonical_bit_boards_batch
+
+EMPTY = -1
+HASH_MULTIPLIERS = (0x9e3779b97f4a7c15, 0xc2b2ae3d27d4eb4f)
+HASH_BATCH_MULTIPLIERS = tuple(np.uint64(multiplier) for multiplier in HASH_MULTIPLIERS)
+HASH_SHIFT = 29
+
+
+def hash_slot(black, white, capacity):
+    mixed = (black * HASH_MULTIPLIERS[0] + white * HASH_MULTIPLIERS[1]) & FULL_MASK
+    mixed ^= mixed >> HASH_SHIFT
+    return mixed & (capacity - 1)
+
+
+def hash_slots(blacks, whites, capacity):
+    # Same hash as hash_slot; uint64 arithmetic wraps like the & FULL_MASK
+    mixed = blacks * HASH_BATCH_MULTIPLIERS[0] + whites * HASH_BATCH_MULTIPLIERS[1]
+    mixed ^= mixed >> np.uint64(HASH_SHIFT)
+    return (mixed & np.uint64(capacity - 1)).astype(np.int64)
+
+
+# Set of distinct positions, each numbered in the order it was first added.
+# With canonical=True a position and its seven symmetric copies share one
+# entry. The table is linear probing over flat numpy arrays, 20 bytes a slot,
+# so tens of millions of positions fit in memory and batches are probed
+# without a Python loop per position.
+class PositionIndex(object):
+    def __init__(self, capacity=1 << 16, max_load_factor=0.75, canonical=True):
+        assert 0 < max_load_factor < 1
+        self._max_load_factor = max_load_factor
+        self._canonical = canonical
+        self._size = 0
+        self._counts = np.zeros(16, dtype=np.int64)
+        self.allocate(self.capacity_for(capacity))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            index = cls(0, float(arrays['max_load_factor']), bool(arrays['canonical']))
+            index._black = arrays['black']
+            index._white = arrays['white']
+            index._ids = arrays['ids']
+            index._size = len(arrays['counts'])
+            index._counts = arrays['counts'].copy()
+        return index
+
+    def save(self, path):
+        # Through a file object so that numpy does not append .npz to the path
+        with open(path, 'wb') as index_file:
+            np.savez(index_file, black=self._black, white=self._white, ids=self._ids,
+                     counts=self._counts[:self._size], canonical=self._canonical,
+                     max_load_factor=self._max_load_factor)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, board_state):
+        return self.position_id(board_state) is not None
+
+    def capacity(self):
+        return len(self._ids)
+
+    def load_factor(self):
+        return float(self._size) / len(self._ids)
+
+    def key(self, board_state):
+        if self._canonical:
+            return board_state.canonical_key()
+        return board_state.as_bit_boards()
+
+    def add(self, board_state):
+        (black, white) = self.key(board_state)
+        return self.insert(black, white)
+
+    def add_bit_boards(self, black, white):
+        if self._canonical:
+            (black, white, _) = canonical_bit_boards(black, white)
+        return self.insert(black, white)
+
+    def position_id(self, board_state):
+        (black, white) = self.key(board_state)
+        (slot, found) = self.find_slot(black, white)
+        return int(self._ids[slot]) if found else None
+
+    def count(self, position_id):
+        return int(self._counts[position_id])
+
+    def counts(self):
+        return self._counts[:self._size]
+
+    def insert(self, black, white):
+        self.reserve(self._size + 1)
+        (slot, found) = self.find_slot(black, white)
+        if found:
+            position_id = int(self._ids[slot])
+        else:
+            position_id = self._size
+            self._black[slot] = black
+            self._white[slot] = white
+            self._ids[slot] = position_id
+            self._size += 1
+            self.reserve_counts(self._size)
+        self._counts[position_id] += 1
+        return position_id
+
+    def find_slot(self, black, white):
+        # The slot holding the position, or the empty slot ending its probe
+        mask = len(self._ids) - 1
+        slot = hash_slot(black, white, len(self._ids))
+        while self._ids[slot] != EMPTY:
+            # int() keeps numpy from comparing uint64 with a long through float64
+            if int(self._black[slot]) == black and int(self._white[slot]) == white:
+                return (slot, True)
+            slot = (slot + 1) & mask
+        return (slot, False)
+
+    def add_batch(self, blacks, whites):
+        # Position ids for every (black, white) pair; new positions are
+        # numbered in the order they first appear in the batch
+        (blacks, whites) = self.batch_keys(blacks, whites)
+        position_ids = self.find_batch(blacks, whites)
+        missing = np.flatnonzero(position_ids == EMPTY)
+        if len(missing) > 0:
+            # Sized as if none of the missing positions repeat
+            self.reserve(self._size + len(missing))
+            position_ids[missing] = self.insert_batch(blacks[missing], whites[missing])
+            self.reserve_counts(self._size)
+        self._counts[:self._size] += np.bincount(position_ids, minlength=self._size)
+        return position_ids
+
+    def lookup_batch(self, blacks, whites):
+        # Position ids, or EMPTY for positions that were never added
+        (blacks, whites) = self.batch_keys(blacks, whites)
+        return self.find_batch(blacks, whites)
+
+    def batch_keys(self, blacks, whites):
+        blacks = np.asarray(blacks, dtype=np.uint64).ravel()
+        whites = np.asarray(whites, dtype=np.uint64).ravel()
+        if self._canonical:
+            (blacks, whites, _) = canonical_bit_boards_batch(blacks, whites)
+        return (blacks, whites)
+
+    def find_batch(self, blacks, whites):
+        # Every position walks its probe sequence one slot per round until it
+        # reaches itself or an empty slot
+        mask = len(self._ids) - 1
+        slots = hash_slots(blacks, whites, len(self._ids))
+        position_ids = np.full(len(blacks), EMPTY, dtype=np.int64)
+        pending = np.arange(len(blacks))
+        while len(pending) > 0:
+            pending_slots = slots[pending]
+            slot_ids = self._ids[pending_slots]
+            empty = slot_ids == EMPTY
+            found = ~empty & (self._black[pending_slots] == blacks[pending]) & \
+                (self._white[pending_slots] == whites[pending])
+            position_ids[pending[found]] = slot_ids[found]
+            probing = ~empty & ~found
+            pending = pending[probing]
+            slots[pending] = (pending_slots[probing] + 1) & mask
+        return position_ids
+
+    def insert_batch(self, blacks, whites):
+        # Ids of positions that are not in the table yet, which may repeat.
+        # Positions reaching the same empty slot in a round all write a claim
+        # into it and the last write stays; writing in reverse order leaves
+        # the earliest claimant there. Copies of a position follow the same
+        # probe sequence, so they arrive with it and find it in the slot.
+        mask = len(self._ids) - 1
+        slots = hash_slots(blacks, whites, len(self._ids))
+        claims = -2 - np.arange(len(blacks))
+        found_slots = np.empty(len(blacks), dtype=np.int64)
+        new_slots = []
+        pending = np.arange(len(blacks))
+        while len(pending) > 0:
+            pending_slots = slots[pending]
+            empty = self._ids[pending_slots] == EMPTY
+            (claimants, claimed_slots) = (pending[empty][::-1], pending_slots[empty][::-1])
+            self._ids[claimed_slots] = claims[claimants]
+            won = self._ids[claimed_slots] == claims[claimants]
+            (winners, won_slots) = (claimants[won], claimed_slots[won])
+            self._black[won_slots] = blacks[winners]
+            self._white[won_slots] = whites[winners]
+            new_slots.append(won_slots)
+            found = (self._black[pending_slots] == blacks[pending]) & \
+                (self._white[pending_slots] == whites[pending])
+            found_slots[pending[found]] = pending_slots[found]
+            pending = pending[~found]
+            slots[pending] = (slots[pending] + 1) & mask
+        # Renumber the claims in order of first appearance
+        new_slots = np.concatenate(new_slots)
+        new_slots = new_slots[np.argsort(-2 - self._ids[new_slots])]
+        self._ids[new_slots] = np.arange(self._size, self._size + len(new_slots))
+        self._size += len(new_slots)
+        return self._ids[found_slots].astype(np.int64)
+
+    def place_batch(self, blacks, whites, position_ids):
+        # Stores distinct positions that are not in the table yet. Positions
+        # that reach the same empty slot in a round all write their id into
+        # it; the one whose id stays there takes the slot and the others
+        # probe on.
+        mask = len(self._ids) - 1
+        slots = hash_slots(blacks, whites, len(self._ids))
+        pending = np.arange(len(blacks))
+        while len(pending) > 0:
+            pending_slots = slots[pending]
+            empty = self._ids[pending_slots] == EMPTY
+            (claimants, claimed_slots) = (pending[empty], pending_slots[empty])
+            self._ids[claimed_slots] = position_ids[claimants]
+            won = self._ids[claimed_slots] == position_ids[claimants]
+            (winners, won_slots) = (claimants[won], claimed_slots[won])
+            self._black[won_slots] = blacks[winners]
+            self._white[won_slots] = whites[winners]
+            waiting = np.ones(len(pending), dtype=bool)
+            waiting[np.flatnonzero(empty)[won]] = False
+            pending = pending[waiting]
+            slots[pending] = (slots[pending] + 1) & mask
+
+    def positions(self):
+        # (black, white) arrays indexed by position id
+        occupied = np.flatnonzero(self._ids != EMPTY)
+        order = occupied[np.argsort(self._ids[occupied])]
+        return (self._black[order], self._white[order])
+
+    def capacity_for(self, size):
+        capacity = 16
+        while capacity * self._max_load_factor < size:
+            capacity <<= 1
+        return capacity
+
+    def allocate(self, capacity):
+        self._black = np.zeros(capacity, dtype=np.uint64)
+        self._white = np.zeros(capacity, dtype=np.uint64)
+        self._ids = np.full(capacity, EMPTY, dtype=np.int32)
+
+    def reserve(self, size):
+        capacity = self.capacity_for(size)
+        if capacity <= len(self._ids):
+            return
+        occupied = np.flatnonzero(self._ids != EMPTY)
+        (blacks, whites, position_ids) = (self._black[occupied], self._white[occupied],
+                                          self._ids[occupied])
+        self.allocate(capacity)
+        self.place_batch(blacks, whites, position_ids)
+
+    def reserve_counts(self, size):
+        if size > len(self._counts):
+            counts = np.zeros(max(size, 2 * len(self._counts)), dtype=np.int64)
+            counts[:len(self._counts)] = self._counts
+            self._counts = counts
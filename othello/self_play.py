@@ -0,0 +1,119 @@
+import json
+import multiprocessing
+import random
+import time
+from logging import getLogger
+from bit_board import BitBoard
+from game_record import GameRecordWriter
+import utilities
+
+worker_state = {}
+
+
+def play_one_game(player_black, player_white, random_opening_plies=0):
+    player_black.set_color('black')
+    player_white.set_color('white')
+    player_black.new_game()
+    player_white.new_game()
+    players = {'black': player_black, 'white': player_white}
+    board_state = BitBoard()
+    player_color = 'black'
+    moves = []
+    passed = False
+    before = time.time()
+    while True:
+        if board_state.has_valid_move(player_color):
+            if len(moves) < random_opening_plies:
+                # Random openings keep deterministic players from repeating one game
+                move = random.choice(board_state.list_all_valid_moves(player_color))
+            else:
+                move = players[player_color].select_move(board_state)
+            board_state.apply_new_move(move, player_color)
+            moves.append((player_color, move))
+            passed = False
+        elif passed:
+            break
+        else:
+            passed = True
+        player_color = utilities.opponent_color(player_color)
+    elapsed = time.time() - before
+    (black_stone, white_stone) = board_state.stone_counts()
+    if black_stone == white_stone:
+        winner = 'draw'
+    else:
+        winner = 'black' if black_stone > white_stone else 'white'
+    return {'moves': [(color, list(move)) for (color, move) in moves],
+            'black_stones': black_stone,
+            'white_stones': white_stone,
+            'winner': winner,
+            'seconds': elapsed}
+
+
+def initialize_worker(black_player_factory, white_player_factory, seed, random_opening_plies):
+    worker_state['player_black'] = black_player_factory()
+    worker_state['player_white'] = white_player_factory()
+    worker_state['seed'] = seed
+    worker_state['random_opening_plies'] = random_opening_plies
+
+
+def play_game_task(game_index):
+    random.seed(worker_state['seed'] + game_index)
+    result = play_one_game(worker_state['player_black'], worker_state['player_white'],
+                           worker_state['random_opening_plies'])
+    result['game'] = game_index
+    return result
+
+
+# Plays games between two player configurations without an Engine, threads
+# or listeners, and appends one JSON line per finished game to the output.
+class SelfPlayRunner(object):
+    def __init__(self, black_player_factory, white_player_factory, processes=None, seed=0,
+                 random_opening_plies=0):
+        self._black_player_factory = black_player_factory
+        self._white_player_factory = white_player_factory
+        self._processes = processes
+        self._seed = seed
+        self._random_opening_plies = random_opening_plies
+        self._logger = getLogger(__name__)
+
+    def run(self, games, output_path, chunk_size=1, result_listener=None, record_path=None):
+        initargs = (self._black_player_factory, self._white_player_factory, self._seed,
+                    self._random_opening_plies)
+        pool = None
+        if self._processes == 1:
+            initialize_worker(*initargs)
+            results = (play_game_task(game_index) for game_index in range(games))
+        else:
+            pool = multiprocessing.Pool(self._processes,
+                                        initializer=initialize_worker,
+                                        initargs=initargs)
+            results = pool.imap_unordered(play_game_task, range(games), chunk_size)
+        summary = {'black': 0, 'white': 0, 'draw': 0}
+        before = time.time()
+        record_writer = None
+        try:
+            if record_path is not None:
+                record_writer = GameRecordWriter(record_path)
+            with open(output_path, 'a') as output:
+                for result in results:
+                    output.write(json.dumps(result) + '\n')
+                    output.flush()
+                    if record_writer is not None:
+                        record_writer.append(result['moves'])
+                        record_writer.flush()
+                    summary[result['winner']] += 1
+                    if result_listener is not None:
+                        result_listener(result)
+        finally:
+            if record_writer is not None:
+                record_writer.close()
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        elapsed = time.time() - before
+        summary['games'] = games
+        summary['seconds'] = elapsed
+        summary['games_per_second'] = games / elapsed if elapsed > 0 else None
+        self._logger.info('Played %d games in %.2fs (%.2f games/s)', games, elapsed,
+                          summary['games_per_second'] or 0.0)
+        return summary
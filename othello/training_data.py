@@ -0,0 +1,144 @@
+import threading
+import numpy as np
+from Queue import Queue, Empty, Full
+from board_batch import BoardBatch, SYMMETRY_NUM, SYMMETRY_SQUARES, mobility_masks
+import utilities
+
+NO_AUGMENTATION = 'none'
+RANDOM_SYMMETRY = 'random'
+ALL_SYMMETRIES = 'all'
+
+# Input planes, all from the point of view of the side to move
+PLAYER_PLANE = 0
+OPPONENT_PLANE = 1
+LEGAL_MOVES_PLANE = 2
+PLANE_NUM = 3
+
+END_OF_BATCHES = object()
+
+
+def build_batch(positions, augmentation=RANDOM_SYMMETRY, random_state=None):
+    # positions is the dict returned by GameRecordReader.positions
+    black_to_move = positions['black_to_move']
+    batch = BoardBatch(positions['black'], positions['white'])
+    (player, opponent) = batch.select_players_and_opponents_board(black_to_move)
+    moves = np.asarray(positions['move'], dtype=np.int64)
+    # Outcome and disc difference of the finished game for the side to move
+    sign = np.where(black_to_move, utilities.color_string_to_number('black'),
+                    utilities.color_string_to_number('white'))
+    outcome = positions['winner'].astype(np.float32) * sign
+    disc_difference = (positions['white_stones'].astype(np.float32) -
+                       positions['black_stones'].astype(np.float32)) * sign
+    if augmentation == ALL_SYMMETRIES:
+        symmetries = np.repeat(np.arange(SYMMETRY_NUM), len(moves))
+        (player, opponent, moves) = [np.tile(values, SYMMETRY_NUM)
+                                     for values in (player, opponent, moves)]
+        (outcome, disc_difference) = [np.tile(values, SYMMETRY_NUM)
+                                      for values in (outcome, disc_difference)]
+    elif augmentation == RANDOM_SYMMETRY:
+        if random_state is None:
+            random_state = np.random
+        symmetries = random_state.randint(0, SYMMETRY_NUM, len(moves))
+    else:
+        assert augmentation == NO_AUGMENTATION
+        symmetries = np.zeros(len(moves), dtype=np.int64)
+    batch = BoardBatch(player, opponent).transform(symmetries)
+    inputs = np.empty((len(batch), PLANE_NUM, 8, 8), dtype=np.float32)
+    inputs[:, PLAYER_PLANE] = batch.as_bit_planes(batch.black)
+    inputs[:, OPPONENT_PLANE] = batch.as_bit_planes(batch.white)
+    inputs[:, LEGAL_MOVES_PLANE] = batch.as_bit_planes(mobility_masks(batch.black, batch.white))
+    labels = {'outcome': outcome,
+              'disc_difference': disc_difference,
+              'move': SYMMETRY_SQUARES[symmetries, moves]}
+    return (inputs, labels)
+
+
+# Streams (inputs, labels) batches of every position in a game record file.
+# Batches are built by background threads and queued ahead of the consumer;
+# with more than one worker they arrive in completion order.
+class TrainingDataPipeline(object):
+    def __init__(self, reader, batch_size=256, augmentation=RANDOM_SYMMETRY,
+                 shuffle=True, workers=2, prefetch_batches=8, seed=0):
+        self._reader = reader
+        self._batch_size = batch_size
+        self._augmentation = augmentation
+        self._shuffle = shuffle
+        self._workers = workers
+        self._prefetch_batches = prefetch_batches
+        self._seed = seed
+        self._epoch = 0
+
+    def batch_indices(self, epoch):
+        position_num = self._reader.position_count()
+        if self._shuffle:
+            indices = np.random.RandomState(self._seed + epoch).permutation(position_num)
+        else:
+            indices = np.arange(position_num)
+        return [indices[start:start + self._batch_size]
+                for start in range(0, position_num, self._batch_size)]
+
+    def build_batch(self, indices, random_state):
+        return build_batch(self._reader.positions(indices), self._augmentation, random_state)
+
+    def batches(self, epochs=1):
+        for _ in range(epochs):
+            for batch in self.epoch_batches(self._epoch):
+                yield batch
+            self._epoch += 1
+
+    def __iter__(self):
+        return self.batches()
+
+    def epoch_batches(self, epoch):
+        tasks = Queue()
+        for (batch_number, indices) in enumerate(self.batch_indices(epoch)):
+            tasks.put((batch_number, indices))
+        results = Queue(self._prefetch_batches)
+        stop = threading.Event()
+        workers = [threading.Thread(target=self.produce_batches,
+                                    args=(tasks, results, stop, epoch),
+                                    name='training_data_worker')
+                   for _ in range(self._workers)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        finished_workers = 0
+        try:
+            while finished_workers < len(workers):
+                result = results.get()
+                if result is END_OF_BATCHES:
+                    finished_workers += 1
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    yield result
+        finally:
+            stop.set()
+            for worker in workers:
+                while worker.is_alive():
+                    try:
+                        results.get_nowait()
+                    except Empty:
+                        pass
+                    worker.join(0.01)
+
+    def produce_batches(self, tasks, results, stop, epoch):
+        try:
+            while not stop.is_set():
+                try:
+                    (batch_number, indices) = tasks.get_nowait()
+                except Empty:
+                    break
+                random_state = np.random.RandomState([self._seed, epoch, batch_number])
+                self.put_result(results, stop, self.build_batch(indices, random_state))
+        except Exception as e:
+            self.put_result(results, stop, e)
+        self.put_result(results, stop, END_OF_BATCHES)
+
+    def put_result(self, results, stop, result):
+        while not stop.is_set():
+            try:
+                results.put(result, timeout=0.1)
+                return
+            except Full:
+                pass
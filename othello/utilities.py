@@ -1,5 +1,7 @@
 import numpy as np
 
+BYTE_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
 
 def color_string_to_number(color_string):
     return (-1 if (color_string == 'black') else 1)
@@ -13,9 +15,21 @@ def opponent_color(color_string):
 
 
 def count_stone_num(board_state):
-    matrix = board_state.as_numpy_matrix()
-    black = np.count_nonzero(
-        matrix == color_string_to_number('black'))
-    white = np.count_nonzero(
-        matrix == color_string_to_number('white'))
-    return (black, white)
+    return board_state.stone_counts()
+
+
+def popcount_bit_boards(bit_boards):
+    bytes_view = np.ascontiguousarray(bit_boards, dtype=np.uint64).view(np.uint8)
+    return BYTE_POPCOUNT[bytes_view.reshape(-1, 8)].sum(axis=1, dtype=np.int64)
+
+
+def count_stone_nums(board_states):
+    # (black, white) count arrays for many boards. Boards of up to 64 squares
+    # are counted together on uint64 arrays, larger ones one at a time.
+    bit_boards = [board_state.as_bit_boards() for board_state in board_states]
+    if all((black | white) >> 64 == 0 for (black, white) in bit_boards):
+        bit_boards = np.array(bit_boards, dtype=np.uint64).reshape(-1, 2)
+        return (popcount_bit_boards(bit_boards[:, 0]), popcount_bit_boards(bit_boards[:, 1]))
+    counts = np.array([board_state.stone_counts() for board_state in board_states],
+                      dtype=np.int64).reshape(-1, 2)
+    return (counts[:, 0], counts[:, 1])
@@ -1,3 +1,4 @@
+import os
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
@@ -8,6 +9,10 @@ from othello.engine import Engine
 from othello.ai.evaluator import Evaluator
 from othello.ai.minimax import MiniMax
 from othello.ai.alpha_beta import AlphaBeta
+from othello.ai.endgame_solver import EndgameSolver
+from othello.ai.transposition_table import TranspositionTable
+from othello.ai.multi_prob_cut import MultiProbCut, load_prob_cut_parameters, \
+    PROB_CUT_PARAMETERS_PATH
 
 
 class OthelloApp(App):
@@ -16,7 +21,8 @@ class OthelloApp(App):
         columns = 8
         self._board = self.setup_board(rows, columns)
         self._engine = Engine(HumanPlayer(self._board),
-                              AiPlayer(AlphaBeta(), Evaluator()),
+                              AiPlayer(self.setup_search_algorithm(), Evaluator(),
+                                       endgame_solver=EndgameSolver(), ponder=True),
                               rows,
                               columns)
         self._engine.set_board_state_change_listener(
@@ -35,6 +41,14 @@ class OthelloApp(App):
         self._root.add_widget(self._buttons)
         return self._root
 
+    def setup_search_algorithm(self):
+        # Multi-ProbCut once prob_cut_calibration_main.py has fitted its parameters
+        transposition_table = TranspositionTable()
+        if os.path.exists(PROB_CUT_PARAMETERS_PATH):
+            return MultiProbCut(depth=4, parameters=load_prob_cut_parameters(PROB_CUT_PARAMETERS_PATH),
+                                transposition_table=transposition_table)
+        return AlphaBeta(transposition_table=transposition_table)
+
     def setup_board(self, rows, columns):
         board = Board(board_rows=rows, board_columns=columns)
         return board
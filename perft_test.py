@@ -0,0 +1,134 @@
+import json
+import time
+from logging import getLogger, INFO, basicConfig
+from othello.bit_board import BitBoard
+from othello.libfastbb import FastBitBoard
+from othello.matrix_board import MatrixBoard
+from othello import utilities
+
+# (name, black bit board, white bit board, side to move, leaf counts for depth 1, 2, ...)
+PERFT_POSITIONS = [
+    ('initial', 0x0000000810000000, 0x0000001008000000, 'black',
+     [4, 12, 56, 244, 1396, 8200]),
+    ('midgame', 0x2050ff4204000400, 0x0008001c18240200, 'black',
+     [12, 148, 1503, 18048]),
+    ('pass_22_empties', 0x003c78382c289c9e, 0x948080c0d0d06060, 'black',
+     [1, 11, 31, 337, 1404]),
+    ('pass_12_empties', 0x00000a9ecfff9c04, 0xfffff56030000000, 'black',
+     [1, 10, 22, 189, 488]),
+    ('pass_10_empties', 0x387afacce2d34efe, 0x808001331c2c3001, 'black',
+     [1, 9, 17, 120, 349]),
+]
+
+BOARD_FACTORIES = [
+    ('BitBoard', lambda black, white: BitBoard(8, 8, black, white)),
+    ('MatrixBoard', lambda black, white: MatrixBoard(
+        8, 8, BitBoard(8, 8, black, white).as_numpy_matrix().astype('int32'))),
+    ('FastBitBoard', lambda black, white: FastBitBoard(8, 8, black, white)),
+]
+
+
+def perft(board_state, player_color, depth, make_unmake=False, passed=False):
+    if depth == 0:
+        return 1
+    opponent_color = utilities.opponent_color(player_color)
+    valid_moves = board_state.list_all_valid_moves(player_color)
+    if not valid_moves:
+        if passed:
+            # Neither side can move: the game ended before the horizon
+            return 1
+        return perft(board_state, opponent_color, depth - 1, make_unmake, True)
+    if depth == 1:
+        return len(valid_moves)
+    nodes = 0
+    for move in valid_moves:
+        if make_unmake:
+            undo_info = board_state.make_move(move, player_color)
+            nodes += perft(board_state, opponent_color, depth - 1, make_unmake)
+            board_state.undo_move(move, undo_info, player_color)
+        else:
+            next_state = board_state.next_board_state(move, player_color)
+            nodes += perft(next_state, opponent_color, depth - 1, make_unmake)
+    return nodes
+
+
+def perft_suite(max_depth=None, board_factories=BOARD_FACTORIES):
+    logger = getLogger(__name__)
+    results = []
+    for (board_name, board_factory) in board_factories:
+        for make_unmake in (False, True):
+            total_nodes = 0
+            total_time = 0.0
+            positions = []
+            for (name, black, white, player_color, expected_counts) in PERFT_POSITIONS:
+                depth = len(expected_counts)
+                if max_depth is not None:
+                    depth = min(depth, max_depth)
+                board_state = board_factory(black, white)
+                before = time.time()
+                nodes = perft(board_state, player_color, depth, make_unmake)
+                elapsed = time.time() - before
+                expected = expected_counts[depth - 1]
+                assert nodes == expected, '%s on %s at depth %d: %d != %d' % (
+                    name, board_name, depth, nodes, expected)
+                assert board_state.as_bit_boards() == (black, white)
+                total_nodes += nodes
+                total_time += elapsed
+                positions.append({'position': name,
+                                  'depth': depth,
+                                  'nodes': nodes,
+                                  'seconds': elapsed,
+                                  'nodes_per_second': nodes / elapsed if elapsed > 0 else None})
+            result = {'board': board_name,
+                      'make_unmake': make_unmake,
+                      'nodes': total_nodes,
+                      'seconds': total_time,
+                      'nodes_per_second': total_nodes / total_time if total_time > 0 else None,
+                      'positions': positions}
+            logger.info('%s (make_unmake=%s): %d nodes in %.3fs', board_name,
+                        make_unmake, total_nodes, total_time)
+            results.append(result)
+    return results
+
+
+# Boards of other sizes have no reference counts, so the implementations are
+# checked against each other; MatrixBoard shares no code with the bit boards
+BOARD_SIZES = [(4, 4), (6, 6), (6, 10), (10, 10), (16, 16)]
+
+
+def board_size_suite(depth=5, board_sizes=BOARD_SIZES):
+    logger = getLogger(__name__)
+    results = []
+    for (rows, columns) in board_sizes:
+        board_factories = [('BitBoard', BitBoard), ('MatrixBoard', MatrixBoard)]
+        if rows * columns <= 64:
+            board_factories.append(('FastBitBoard', FastBitBoard))
+        counts = {}
+        for (board_name, board_factory) in board_factories:
+            before = time.time()
+            counts[board_name] = perft(board_factory(rows, columns), 'black', depth)
+            elapsed = time.time() - before
+            results.append({'board': board_name,
+                            'size': [rows, columns],
+                            'depth': depth,
+                            'nodes': counts[board_name],
+                            'seconds': elapsed})
+            logger.info('%s %dx%d: %d nodes in %.3fs', board_name, rows, columns,
+                        counts[board_name], elapsed)
+        assert len(set(counts.values())) == 1, '%dx%d: %s' % (rows, columns, str(counts))
+    return results
+
+
+def output_results_to_file(file_name, results):
+    with open(file_name, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    basicConfig(level=INFO)
+    logger = getLogger(__name__)
+    logger.info("Running perft suite")
+    perft_results = perft_suite()
+    perft_results.extend(board_size_suite())
+    output_results_to_file('perft_results.json', perft_results)
+    logger.info("Perft suite done")
@@ -0,0 +1,59 @@
+import os
+import random
+import numpy as np
+from logging import getLogger, INFO, basicConfig
+from othello.ai.multi_prob_cut import ProbCutCalibrator, PROB_CUT_PARAMETERS_PATH
+from othello.ai.bit_board_evaluator import BitBoardEvaluator
+from othello.bit_board import BitBoard
+from othello.game_record import GameRecordReader
+from othello import utilities
+
+SAMPLE_POSITIONS = 300
+DEPTH_PAIRS = ((3, 1), (4, 2), (5, 3))
+STAGE_BOUNDS = ((0, 20), (21, 40), (41, 64))
+
+
+def self_play_positions(path, count, random_state):
+    reader = GameRecordReader(path)
+    position_count = reader.position_count()
+    indices = random_state.choice(position_count, size=min(count, position_count), replace=False)
+    positions = reader.positions(np.sort(indices))
+    for (black, white, black_to_move) in zip(positions['black'], positions['white'],
+                                             positions['black_to_move']):
+        yield (BitBoard(8, 8, int(black), int(white)), 'black' if black_to_move else 'white')
+
+
+def random_game_positions(count, random_generator):
+    # One position from each of count random games
+    for _ in range(count):
+        board_state = BitBoard()
+        player_color = 'black'
+        for _ in range(random_generator.randrange(60)):
+            if board_state.is_end_state():
+                break
+            valid_moves = board_state.list_all_valid_moves(player_color)
+            if valid_moves:
+                board_state.apply_new_move(random_generator.choice(valid_moves), player_color)
+            player_color = utilities.opponent_color(player_color)
+        yield (board_state, player_color)
+
+
+def main():
+    logger = getLogger(__name__)
+    calibrator = ProbCutCalibrator(BitBoardEvaluator(), DEPTH_PAIRS, STAGE_BOUNDS)
+    if os.path.exists('self_play_games.bin'):
+        positions = self_play_positions('self_play_games.bin', SAMPLE_POSITIONS,
+                                        np.random.RandomState(0))
+    else:
+        positions = random_game_positions(SAMPLE_POSITIONS, random.Random(0))
+    for (board_state, player_color) in positions:
+        calibrator.add_position(board_state, player_color)
+    parameters = calibrator.write(PROB_CUT_PARAMETERS_PATH)
+    logger.info("ProbCut calibrated on %d positions", calibrator.position_count())
+    for pair in parameters['pairs']:
+        logger.info("%s", str(pair))
+
+
+if __name__ == '__main__':
+    basicConfig(level=INFO)
+    main()
@@ -0,0 +1,26 @@
+from logging import getLogger, INFO, basicConfig
+from othello.self_play import SelfPlayRunner
+from othello.ai.alpha_beta import AlphaBeta
+from othello.ai.bit_board_evaluator import BitBoardEvaluator
+from ai_player import AiPlayer
+
+# The players are deterministic, so every game starts from random moves
+RANDOM_OPENING_PLIES = 8
+
+
+def alpha_beta_player():
+    return AiPlayer(AlphaBeta(depth=2, make_unmake=True), BitBoardEvaluator())
+
+
+def main():
+    logger = getLogger(__name__)
+    runner = SelfPlayRunner(alpha_beta_player, alpha_beta_player,
+                            random_opening_plies=RANDOM_OPENING_PLIES)
+    summary = runner.run(games=100, output_path='self_play_results.jsonl',
+                         record_path='self_play_games.bin')
+    logger.info("Self-play finished: %s", summary)
+
+
+if __name__ == '__main__':
+    basicConfig(level=INFO)
+    main()